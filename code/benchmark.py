@@ -0,0 +1,250 @@
+#!/usr/bin/env python2.6
+######################################################################
+# benchmark.py
+######################################################################
+# A benchmark harness for the FP algorithms, which records timings,
+# memory and pattern counts as JSON and checks them against a stored
+# baseline.
+######################################################################
+# For license information, see LICENSE file
+# For copyright information, see COPYRIGHT file
+######################################################################
+
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import time
+import cPickle as pickle
+from optparse import OptionParser
+from dataset import BinaryDataset
+from fp_mining import collectStats, iterAprioriPatterns, \
+    iterFPGrowthPatterns, iterEclatPatterns
+from instrumentation import configureLogging
+
+######################################################################
+# Configuration
+######################################################################
+# Each dataset is run at a few minimum supports, given as fractions
+# of its rows, chosen so that every miner finishes in seconds.  A
+# support that rounds down to zero would count patterns that never
+# occur, which FP-Growth cannot find, so none do.
+######################################################################
+
+DATA_PATH = '../data/'
+
+DATASETS = [('tiny.dat',[.25,.5]),
+            ('chess_tiny.dat',[.8,.9]),
+            ('chess_small.dat',[.8,.9]),
+            ('chess.dat',[.8,.9]),
+            ('mushroom.dat',[.3,.5])]
+
+######################################################################
+# Miners
+######################################################################
+# The patterns are counted as they are yielded, so the harness never
+# holds them all.  The miners time their own phases, such as building
+# the FP-Tree and mining it, and count their work, into the Stats of
+# fp_mining.collectStats.
+######################################################################
+
+def iterMatrixApriori(ds,k,min_sup,kmin):
+    return iterAprioriPatterns(ds,k,min_sup,kmin=kmin,engine='numpy')
+
+MINERS = {'apriori':iterAprioriPatterns,
+          'apriori-numpy':iterMatrixApriori,
+          'fpgrowth':iterFPGrowthPatterns,
+          'eclat':iterEclatPatterns}
+
+######################################################################
+# Runs
+######################################################################
+# Every run happens in a forked child, so that its peak RSS is its
+# own and not that of the runs before it.  The child loads the
+# dataset itself, times it as the load phase, and sends its result
+# back through a pipe.  The binary cache of the dataset is written
+# beforehand, outside the timed child, so that the first run of a
+# fresh checkout times the same load as every later one.
+######################################################################
+
+def cacheDataset(filename):
+    """ writes the binary cache of filename if it is missing or stale """
+    with open(filename,'rU') as f:
+        BinaryDataset().readFromFile(f)
+
+def runCase(filename,miner,k,kmin,support,preprocess=False):
+    """ returns the result dict of one run in a forked child """
+    cacheDataset(filename)
+    (readFd,writeFd) = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(readFd)
+        try:
+            stats = collectStats()
+            start = time.time()
+            with stats.phase('load'):
+                ds = BinaryDataset()
+                with open(filename,'rU') as f:
+                    ds.readFromFile(f)
+            min_sup = int(support * len(ds))
+            if preprocess:
+                with stats.phase('preprocess'):
+                    ds = ds.preprocess(min_sup)
+            patterns = MINERS[miner](ds,k,min_sup,kmin=kmin)
+            patterns = sum(1 for _ in patterns)
+            result = {'rows':len(ds),
+                      'min_sup':min_sup,
+                      'wall':time.time() - start,
+                      'patterns':patterns,
+                      'phases':stats.phases,
+                      'counts':stats.counts,
+                      'maxDepth':stats.maxDepth,
+                      'maxrss_kb':
+                          resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+        except Exception, e:
+            result = {'error':repr(e)}
+        with os.fdopen(writeFd,'wb') as f:
+            pickle.dump(result,f,pickle.HIGHEST_PROTOCOL)
+        os._exit(0)
+
+    os.close(writeFd)
+    with os.fdopen(readFd,'rb') as f:
+        result = pickle.load(f)
+    os.waitpid(pid,0)
+    if 'error' in result:
+        raise RuntimeError('{0} on {1} failed: {2}'.format(
+                miner,filename,result['error']))
+    return result
+
+def caseKey(case):
+    return '{0} {1}{2} k={3}..{4} support={5}'.format(
+        case['dataset'],case['miner'],
+        ' preprocessed' if case.get('preprocess') else '',
+        case['kmin'],case['k'],case['support'])
+
+def runBenchmarks(datasets,miners,k,kmin,runs=1,preprocess=False):
+    """ returns a list of result dicts, keeping the fastest of runs """
+    results = []
+    for (name,supports) in datasets:
+        for support in supports:
+            for miner in miners:
+                best = None
+                for _ in range(runs):
+                    result = runCase(DATA_PATH + name,miner,k,kmin,support,
+                                     preprocess)
+                    if best == None or result['wall'] < best['wall']:
+                        best = result
+                best.update({'dataset':name,'miner':miner,'k':k,
+                             'kmin':kmin,'support':support,
+                             'preprocess':preprocess})
+                log.info('{0}: {1:.3f}s, {2} patterns, {3} KB'.format(
+                        caseKey(best),best['wall'],best['patterns'],
+                        best['maxrss_kb']))
+                results.append(best)
+    return results
+
+######################################################################
+# Baselines
+######################################################################
+# A run regresses when it is slower than its baseline by more than
+# tolerance, as a fraction, and by more than slack seconds, which
+# keeps the timer noise of millisecond runs from failing a check.  A
+# changed pattern count is always a failure.  Cases missing from the
+# baseline are not checked.
+#
+# The scripts/*_timing.sh wrappers check against the committed
+# baselines/benchmark.json.  Its timings only mean something on a
+# similar machine; to regenerate it, run every default case from
+# code/ with
+#   ./benchmark.py -r 3 ../baselines/benchmark.json
+######################################################################
+
+def compareResults(results,baseline,tolerance=0.2,slack=0.05):
+    """ returns a list of messages, one per regression against baseline """
+    previous = dict((caseKey(x),x) for x in baseline)
+    failures = []
+    for result in results:
+        key = caseKey(result)
+        if key not in previous:
+            continue
+        old = previous[key]
+        if result['patterns'] != old['patterns']:
+            failures.append('{0}: found {1} patterns, baseline {2}'.format(
+                    key,result['patterns'],old['patterns']))
+        limit = old['wall'] * (1 + tolerance)
+        if result['wall'] > limit and result['wall'] - old['wall'] > slack:
+            failures.append('{0}: took {1:.3f}s, baseline {2:.3f}s'.format(
+                    key,result['wall'],old['wall']))
+    return failures
+
+def writeResults(results,path):
+    with open(path,'w') as f:
+        json.dump({'python':platform.python_version(),
+                   'machine':platform.machine(),
+                   'created':time.strftime('%Y-%m-%d %H:%M:%S'),
+                   'results':results},f,indent=1,sort_keys=True)
+
+def readResults(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+######################################################################
+# Main
+######################################################################
+
+log = logging.getLogger('benchmark')
+
+if __name__ == '__main__':
+    parser = OptionParser(usage='%prog [options] [output.json]')
+    parser.add_option('-m','--miners',default='apriori,fpgrowth,eclat',
+                      help='comma separated miners, of '
+                      '{0} [%default]'.format(','.join(sorted(MINERS))))
+    parser.add_option('-d','--datasets',default=None,
+                      help='comma separated dataset files [all]')
+    parser.add_option('-s','--supports',default=None,
+                      help='comma separated support fractions '
+                      '[per dataset]')
+    parser.add_option('-k',type='int',default=3,
+                      help='largest pattern length [%default]')
+    parser.add_option('--kmin',type='int',default=1,
+                      help='smallest pattern length [%default]')
+    parser.add_option('-p','--preprocess',action='store_true',default=False,
+                      help='mine a PreprocessedDataset of each file')
+    parser.add_option('-r','--runs',type='int',default=1,
+                      help='runs per case, the fastest is kept [%default]')
+    parser.add_option('-b','--baseline',default=None,
+                      help='JSON results to compare against')
+    parser.add_option('-t','--tolerance',type='float',default=0.2,
+                      help='allowed fractional slowdown [%default]')
+    parser.add_option('--slack',type='float',default=0.05,
+                      help='allowed slowdown in seconds [%default]')
+    (options,args) = parser.parse_args()
+
+    configureLogging()
+    logging.getLogger('fpLog').setLevel(logging.WARNING)
+
+    datasets = DATASETS
+    if options.datasets != None:
+        names = options.datasets.split(',')
+        datasets = filter(lambda x: x[0] in names,DATASETS) + \
+            map(lambda x: (x,[.5]),
+                filter(lambda x: x not in dict(DATASETS),names))
+    if options.supports != None:
+        supports = map(float,options.supports.split(','))
+        datasets = map(lambda x: (x[0],supports),datasets)
+
+    results = runBenchmarks(datasets,options.miners.split(','),
+                            options.k,options.kmin,options.runs,
+                            options.preprocess)
+    if len(args) > 0:
+        writeResults(results,args[0])
+
+    if options.baseline != None:
+        failures = compareResults(results,readResults(options.baseline),
+                                  options.tolerance,options.slack)
+        for failure in failures:
+            print >> sys.stderr, 'REGRESSION {0}'.format(failure)
+        if len(failures) > 0:
+            sys.exit(1)
@@ -10,7 +10,12 @@
 # For copyright information, see COPYRIGHT file
 ######################################################################
 
+import mmap
+import os
+import struct
+from binascii import hexlify
 from collections import defaultdict
+from itertools import izip
 
 ######################################################################
 # Dataset
@@ -18,6 +23,10 @@ from collections import defaultdict
 # The most basic dataset which stores itemsets as rows.
 ######################################################################
 
+def parseRow(line):
+    canonical = line.strip().lower()
+    return canonical.split(" ")
+
 class Dataset(object):
     def __init__(self):
         self.rows = []
@@ -30,22 +39,27 @@ class Dataset(object):
 
     def readFromFile(self,f):
         for line in f:
-            canonical = line.strip().lower()
-            self.rows.append(canonical.split(" "))
+            self.rows.append(parseRow(line))
 
     def readFromDataset(self,ds):
         if not hasattr(ds,'__IS_VERTICAL__'):
             self.rows = []
-            for row in ds.rows:
-                self.rows.append(row[:])
+            for row in ds:
+                self.rows.append(list(row))
             return
         
         transactions = defaultdict(list)
         for key in ds.tidsets.keys():
-            for val in ds.tidsets[key]:
+            for val in ds.tids(key):
                 transactions[val].append(key)
         self.rows = transactions.values()
 
+    def preprocess(self,min_sup=0):
+        """ returns a PreprocessedDataset of the rows of self """
+        pds = PreprocessedDataset()
+        pds.readFromDataset(self,min_sup)
+        return pds
+
 ######################################################################
 # NumericalDataset
 ######################################################################
@@ -68,19 +82,252 @@ class NumericalDataset(Dataset):
         Dataset.readFromDataset(self,ds)
         self._convertToNumerical()
 
+######################################################################
+# StreamingDataset
+######################################################################
+# This dataset keeps no rows in memory.  It remembers the file it was
+# read from and re-reads it on every iteration, so each pass a miner
+# makes over the data is a sequential scan of the file and memory use
+# no longer grows with its size.
+######################################################################
+
+class StreamingDataset(Dataset):
+    def __init__(self,numerical=False):
+        self.filename = None
+        self.numerical = numerical
+        self.length = None
+
+    def __len__(self):
+        if self.length == None:
+            self.length = sum(1 for _ in self)
+        return self.length
+
+    def __iter__(self):
+        numerical = self.numerical
+        with open(self.filename,'rU') as f:
+            for line in f:
+                row = parseRow(line)
+                yield map(int,row) if numerical else row
+
+    @property
+    def rows(self):
+        return iter(self)
+
+    def readFromFile(self,f):
+        self.filename = f.name
+        self.length = None
+
+    def readFromDataset(self,ds):
+        raise TypeError('a StreamingDataset can only read files')
+
+######################################################################
+# BinaryDataset
+######################################################################
+# This dataset stores numerical itemsets in a compact binary cache of
+# a text dataset, written once next to the text file.  The cache is a
+# header, the item ids of every row back to back, then the offset of
+# each row into the item ids (a CSR layout).  It is memory-mapped, so
+# opening it is near-instant and a row is only decoded when it is
+# reached.  When the cache can not be written, say in a read-only data
+# directory, the rows are parsed into memory instead.
+######################################################################
+
+BINARY_MAGIC = 'FPMB'
+BINARY_HEADER = struct.Struct('<4sQQ')
+
+def writeBinaryDataset(rows,path):
+    """ writes the numerical rows to path in the binary dataset format """
+    tmpPath = path + '.tmp'
+    offsets = [0]
+    try:
+        with open(tmpPath,'wb') as f:
+            f.write(BINARY_HEADER.pack(BINARY_MAGIC,0,0))
+            for row in rows:
+                f.write(struct.pack('<{0}i'.format(len(row)),*row))
+                offsets.append(offsets[-1] + len(row))
+            f.write(struct.pack('<{0}Q'.format(len(offsets)),*offsets))
+            f.seek(0)
+            f.write(BINARY_HEADER.pack(BINARY_MAGIC,len(offsets) - 1,
+                                       offsets[-1]))
+        os.rename(tmpPath,path)
+    except:
+        # a bad item raises ValueError or struct.error, not only IO
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
+
+class BinaryRows(object):
+    """ a read-only sequence of the rows in a memory-mapped binary file """
+    def __init__(self,path):
+        with open(path,'rb') as f:
+            self.mm = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        (magic,self.nrows,nitems) = BINARY_HEADER.unpack_from(self.mm,0)
+        if magic != BINARY_MAGIC:
+            raise ValueError('{0} is not a binary dataset'.format(path))
+        self.itemsPos = BINARY_HEADER.size
+        self.offsetsPos = self.itemsPos + 4 * nitems
+
+    def __len__(self):
+        return self.nrows
+
+    def _row(self,start,end):
+        return list(struct.unpack_from('<{0}i'.format(end - start),self.mm,
+                                       self.itemsPos + 4 * start))
+
+    def __getitem__(self,i):
+        if i < 0:
+            i += self.nrows
+        if i < 0 or i >= self.nrows:
+            raise IndexError('row index out of range')
+        (start,end) = struct.unpack_from('<2Q',self.mm,self.offsetsPos + 8*i)
+        return self._row(start,end)
+
+    def __iter__(self):
+        offset = struct.Struct('<Q')
+        pos = self.offsetsPos
+        start = offset.unpack_from(self.mm,pos)[0]
+        for _ in xrange(self.nrows):
+            pos += 8
+            end = offset.unpack_from(self.mm,pos)[0]
+            yield self._row(start,end)
+            start = end
+
+class BinaryDataset(Dataset):
+    CACHE_SUFFIX = '.bin'
+
+    def readFromFile(self,f):
+        """ maps the binary cache of text file f, writing it if stale """
+        cachePath = f.name + self.CACHE_SUFFIX
+        if not os.path.exists(cachePath) or \
+                os.path.getmtime(cachePath) < os.path.getmtime(f.name):
+            rows = (map(int,line.split()) for line in f)
+            try:
+                writeBinaryDataset(rows,cachePath)
+            except EnvironmentError:
+                f.seek(0)
+                self.rows = map(lambda x: map(int,x.split()),f)
+                return
+        self.readFromCache(cachePath)
+
+    def readFromCache(self,path):
+        self.rows = BinaryRows(path)
+
+######################################################################
+# PreprocessedDataset
+######################################################################
+# Mining raw rows keeps revisiting items that can never be frequent,
+# compares arbitrary labels, and counts identical rows one by one.  A
+# PreprocessedDataset is built once from another dataset and a
+# minimum support.  Items below it are dropped, the rest are recoded
+# to dense ints by descending frequency (so a row sorted by id is
+# sorted by frequency), and identical rows are kept once with a
+# weight.
+#
+# Iterating it still yields every transaction, repeating a row as
+# often as its weight, so any code sees the same data.  The miners
+# instead go through weightedRows, and map their patterns back
+# through labels.  Below its min_sup the dropped items could be
+# frequent again, so the miners refuse to mine it there.
+######################################################################
+
+def weightedRows(ds):
+    """ iterates over (row,weight) pairs covering the transactions of ds """
+    if hasattr(ds,'__IS_PREPROCESSED__'):
+        return izip(ds.rows,ds.weights)
+    return ((row,1) for row in ds)
+
+class PreprocessedDataset(Dataset):
+    def __init__(self):
+        Dataset.__init__(self)
+        self.weights = []
+        self.labels = []
+        self.min_sup = 0
+        self.size = 0
+        self.__IS_PREPROCESSED__ = True
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for (row,weight) in izip(self.rows,self.weights):
+            for _ in xrange(weight):
+                yield row
+
+    def readFromFile(self,f,min_sup=0):
+        ds = Dataset()
+        ds.readFromFile(f)
+        self.readFromDataset(ds,min_sup)
+
+    def readFromDataset(self,ds,min_sup=0):
+        if hasattr(ds,'__IS_VERTICAL__'):
+            rows = Dataset()
+            rows.readFromDataset(ds)
+            ds = rows
+        counts = defaultdict(int)
+        for (row,weight) in weightedRows(ds):
+            for item in set(row):
+                counts[item] += weight
+        self.min_sup = min_sup
+        self.labels = sorted(filter(lambda x: counts[x] >= min_sup,
+                                    counts.keys()),
+                             key=lambda x: (-counts[x],x))
+        itemIds = dict((label,i) for (i,label) in enumerate(self.labels))
+
+        rowIds = dict()
+        self.rows = []
+        self.weights = []
+        for (row,weight) in weightedRows(ds):
+            key = tuple(sorted(itemIds[x] for x in set(row) if x in itemIds))
+            if key in rowIds:
+                self.weights[rowIds[key]] += weight
+            else:
+                rowIds[key] = len(self.rows)
+                self.rows.append(list(key))
+                self.weights.append(weight)
+        self.size = sum(self.weights)
+
 ######################################################################
 # VerticalDataset
 ######################################################################
 # This dataset stores item values in a list of values and for each
 # item value there is a list of itemsets in which it appears, these
 # lists are stored in rows.
+#
+# With bitsets=True each tidset is instead an int whose bit i is set
+# when the item appears in transaction i.  Intersection is then a
+# bitwise and, and support is a popcount.  Callers should go through
+# intersect, difference and support so either representation works.
+#
+# Read from a PreprocessedDataset, each of its distinct rows is one
+# transaction id and support adds up their weights.  With bitsets
+# that is one popcount per distinct weight, against a mask of the
+# rows with that weight.
 ######################################################################
 
+def bitsetFromTids(tids,n):
+    """ packs the transaction ids tids (all below n) into an int """
+    bits = bytearray((n + 7) // 8)
+    for tid in tids:
+        bits[tid >> 3] |= 1 << (tid & 7)
+    bits.reverse()
+    return int(hexlify(bits),16) if len(bits) > 0 else 0
+
+def popcount(bits):
+    return bin(bits).count('1')
+
 class VerticalDataset(Dataset):
-    def __init__(self):
-        self.tidsets = defaultdict(set)
+    def __init__(self,bitsets=False):
+        Dataset.__init__(self)
+        self.bitsets = bitsets
+        self.tidsets = defaultdict(int if bitsets else set)
+        self.weights = None
         self.__IS_VERTICAL__ = True
 
+    def __len__(self):
+        if self.weights == None:
+            return len(self.rows)
+        return self.size
+
     def _convertToVertical(self):
         transactions = self.rows
 
@@ -89,19 +336,95 @@ class VerticalDataset(Dataset):
             for val in row:
                 tidsets[val].add(i)
 
+        if self.bitsets:
+            n = len(transactions)
+            bitsets = defaultdict(int)
+            for (val,tids) in tidsets.iteritems():
+                bitsets[val] = bitsetFromTids(tids,n)
+            tidsets = bitsets
+            if self.weights != None:
+                byWeight = defaultdict(list)
+                for (i,weight) in enumerate(self.weights):
+                    byWeight[weight].append(i)
+                self.weightMasks = map(lambda x: (x[0],bitsetFromTids(x[1],n)),
+                                       byWeight.iteritems())
+
         self.tidsets = tidsets
 
+    def support(self,tids):
+        """ the number of transactions in the tidset tids """
+        if self.weights != None:
+            if self.bitsets:
+                return sum(weight * popcount(tids & mask)
+                           for (weight,mask) in self.weightMasks)
+            weights = self.weights
+            return sum(weights[tid] for tid in tids)
+        if self.bitsets:
+            return popcount(tids)
+        return len(tids)
+
+    def intersect(self,tids1,tids2):
+        return tids1 & tids2
+
+    def difference(self,tids1,tids2):
+        """ the tids in tids1 but not in tids2 """
+        if self.bitsets:
+            return tids1 & ~tids2
+        return tids1 - tids2
+
+    def tidsetHash(self,tids):
+        """ a cheap hash of tids, equal for equal tidsets """
+        if self.bitsets:
+            return hash(tids)
+        return sum(tids)
+
+    def tids(self,item):
+        """ iterates over the transaction ids containing item """
+        tids = self.tidsets.get(item)
+        if tids == None:
+            return iter(())
+        if not self.bitsets:
+            return iter(tids)
+        # bin() lists the bits high to low after its '0b' prefix
+        return (i for (i,bit) in enumerate(bin(tids)[:1:-1]) if bit == '1')
+
+    def itemsetSupport(self,itemset):
+        """ the number of transactions containing every item of itemset """
+        itemset = list(itemset)
+        if len(itemset) == 0:
+            return len(self)
+        # an unknown item has no tids; indexing the defaultdict would
+        # add an empty tidset for it
+        tidsets = self.tidsets
+        if any(item not in tidsets for item in itemset):
+            return 0
+        tids = tidsets[itemset[0]]
+        for item in itemset[1:]:
+            tids = self.intersect(tids,tidsets[item])
+        return self.support(tids)
+
     def readFromFile(self,f):
         Dataset.readFromFile(self,f)
         self._convertToVertical()
     
     def readFromDataset(self,ds):
-        if hasattr(ds,'__IS_VERTICAL__'):
-            self.rows = ds.rows[:]
-            self.values = ds.values[:]
-            return
-        Dataset.readFromDataset(self,ds)
+        if hasattr(ds,'__IS_PREPROCESSED__'):
+            # keep the distinct rows and weights, and the labels to decode
+            self.rows = map(list,ds.rows)
+            self.weights = list(ds.weights)
+            self.size = len(ds)
+            self.labels = ds.labels
+            self.min_sup = ds.min_sup
+            self.__IS_PREPROCESSED__ = True
+        else:
+            Dataset.readFromDataset(self,ds)
         self._convertToVertical()
+
+    def __iter__(self):
+        if self.weights == None:
+            return iter(self.rows)
+        return (row for (row,weight) in izip(self.rows,self.weights)
+                for _ in xrange(weight))
                 
 ######################################################################
 # Basic Tests
@@ -9,19 +9,125 @@
 # For copyright information, see COPYRIGHT file
 ######################################################################
 
+from array import array
 from collections import deque
-from itertools import combinations
+from functools import wraps
+from inspect import getargspec
+from heapq import heappush, heapreplace
+from itertools import combinations, islice
+from multiprocessing import Pool
+from multiprocessing.sharedctypes import RawArray
+from math import log as ln, sqrt
+from operator import add
+from random import Random
 import logging
-import logging.config
-from dataset import Dataset, NumericalDataset, VerticalDataset
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from dataset import Dataset, BinaryDataset, StreamingDataset, \
+    VerticalDataset, weightedRows
+from instrumentation import Stats, NoPhase, configureLogging
+from pattern_io import FimiPatternWriter
 
 ######################################################################
 # Logging Setup
 ######################################################################
+# Logging is configured by the scripts' main blocks, not on import.
+# The miners only log once per call; what happens inside them is
+# counted by the instrumentation below instead.
+######################################################################
 
-logging.config.fileConfig('../config/logging.conf')
 log = logging.getLogger('fpLog')
 
+######################################################################
+# Instrumentation
+######################################################################
+# While collectStats is on, the miners count into the Stats object it
+# returns, which can be read once they are done:
+#   apriori.candidates, apriori.pruned   candidates kept and pruned
+#   fpgrowth.trees, fpgrowth.nodes       FP-Trees built and their nodes
+#   eclat.tidsets                        tidsets or diffsets computed
+# as well as the deepest recursion and the time spent in each phase.
+# Every hook is behind a test of stats against None, so while it is
+# off nothing is counted or formatted.  Worker processes keep their
+# own counts, which are not gathered.
+######################################################################
+
+stats = None
+NO_PHASE = NoPhase()
+
+def collectStats(enabled=True):
+    """ starts counting into a new Stats and returns it, or stops """
+    global stats
+    stats = Stats() if enabled else None
+    return stats
+
+def phase(name):
+    """ a with block timing phase name while stats are collected """
+    if stats == None:
+        return NO_PHASE
+    return stats.phase(name)
+
+######################################################################
+# Preprocessed Datasets
+######################################################################
+# A PreprocessedDataset (see dataset.py) holds weighted rows of dense
+# item ids.  The miners count rows through weightedRows, so each
+# distinct row is visited once with its weight, and the public miners
+# are wrapped by decodesLabels to hand back the original labels, both
+# in the patterns they return and in any supports dict they fill.
+# The items dropped by preprocessing can only be ignored at or above
+# its min_sup, so mining below it is an error.
+######################################################################
+
+def checkMinSup(ds,min_sup):
+    """ raises ValueError if min_sup is below that ds was preprocessed at """
+    if min_sup < getattr(ds,'min_sup',0):
+        raise ValueError('min_sup {0} is below the {1} the dataset was '
+                         'preprocessed with'.format(min_sup,ds.min_sup))
+
+class DecodingSupports(object):
+    """ fills a supports dict with the decoded patterns it is given """
+    def __init__(self,supports,labels):
+        self.supports = supports
+        self.labels = labels
+
+    def update(self,patterns):
+        self.supports.update(decodePatterns(patterns,self.labels))
+
+def decodesLabels(miner):
+    """ wraps miner(ds,...) to decode patterns of preprocessed datasets """
+    # miner may return a dict or an iterator of (pattern,support)
+    spec = getargspec(miner)
+    argNames = spec.args
+    defaults = dict(zip(reversed(argNames),reversed(spec.defaults or ())))
+    @wraps(miner)
+    def decodingMiner(ds,*args,**kwargs):
+        if not hasattr(ds,'__IS_PREPROCESSED__'):
+            return miner(ds,*args,**kwargs)
+        if 'min_sup' in argNames:
+            i = argNames.index('min_sup') - 1
+            if i < len(args):
+                checkMinSup(ds,args[i])
+            else:
+                checkMinSup(ds,kwargs.get('min_sup',defaults.get('min_sup')))
+        if 'supports' in argNames:
+            i = argNames.index('supports') - 1
+            if i < len(args) and args[i] != None:
+                args = args[:i] + (DecodingSupports(args[i],ds.labels),) + \
+                    args[i+1:]
+            elif kwargs.get('supports') != None:
+                kwargs['supports'] = DecodingSupports(kwargs['supports'],
+                                                      ds.labels)
+        patterns = miner(ds,*args,**kwargs)
+        if isinstance(patterns,dict):
+            return decodePatterns(patterns,ds.labels)
+        labels = ds.labels
+        return ((tuple(sorted(map(lambda x: labels[x],pattern))),support)
+                for (pattern,support) in patterns)
+    return decodingMiner
+
 ######################################################################
 # Apriori
 ######################################################################
@@ -33,84 +139,363 @@ log = logging.getLogger('fpLog')
 # finally we can find the frequent itemsets of size k.
 ######################################################################
 
-def countItems(row):
-    """ counts items in a row (list), returns a dict(item -> count) """
-    counts = dict()
-    for e in row:
-        if e in counts.keys():
-            counts[e] += 1
-        else:
-            counts[e] = 1
-    return counts
+def supportFilter(counts,min_sup):
+    """ returns the entries of dict(pattern -> count) with min_sup """
+    return dict((pattern,count) for (pattern,count) in counts.iteritems()
+                if count >= min_sup)
 
-def countCandidates(row,cands):
+def countDatasetItems(ds):
+    """ counts the rows of ds containing each item, returns a dict """
     counts = dict()
-    itemset = set(row)
-    for cand in cands:
-        candSet = set(cand)
-        counts[str(cand)] = 1 if candSet <= itemset else 0
+    for (row,weight) in weightedRows(ds):
+        for item in set(row):
+            counts[item] = counts.get(item,0) + weight
     return counts
 
-def mergeCounts(counts1,counts2):
-    """ Takes two count dicts and returns the dict merge of both """
-    merge = dict()
-    for key in counts1.keys() + counts2.keys():
-        merge[key] = 0
-        if key in counts1:
-            merge[key] += counts1[key]
-        if key in counts2:
-            merge[key] += counts2[key]
-    return merge
-
-def sort(l):
-    m = l[:]
-    m.sort()
-    return m
+def hasInfrequentSubset(cand,prevCands):
+    """ true if some (k-1)-subset of the k-tuple cand is not in prevCands """
+    # dropping either of the last two items yields one of the joined
+    # parents, which are frequent by construction
+    for i in range(len(cand)-2):
+        if cand[:i] + cand[i+1:] not in prevCands:
+            return True
+    return False
+
+def aprioriGen(prevCands):
+    """ given frequent (k-1)-tuples, join and prune to get k-candidates """
+    prevCands = sorted(prevCands)
+    prevSet = set(prevCands)
+    cands = []
+    pruned = 0
+    for (i,first) in enumerate(prevCands):
+        prefix = first[:-1]
+        for second in prevCands[i+1:]:
+            # sorted order keeps tuples sharing a prefix contiguous
+            if second[:-1] != prefix:
+                break
+            cand = first + second[-1:]
+            if not hasInfrequentSubset(cand,prevSet):
+                cands.append(cand)
+            else:
+                pruned += 1
+    if stats != None:
+        stats.count('apriori.candidates',len(cands))
+        stats.count('apriori.pruned',pruned)
+    return cands
+
+class CandidateTrie(object):
+    """ a prefix trie over sorted k-candidates for counting support """
+    # Inner nodes are dicts from item to child; the last level maps an
+    # item to the candidate tuple itself, which keys self.counts.  A
+    # row is counted by walking its sorted items down the trie, so
+    # only the candidates it actually contains are ever visited.
+
+    def __init__(self,cands=()):
+        self.root = dict()
+        self.counts = dict()
+        self.items = set()
+        self.k = 0
+        for cand in cands:
+            self.addCandidate(cand)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def addCandidate(self,cand):
+        node = self.root
+        for item in cand[:-1]:
+            node = node.setdefault(item,dict())
+        node[cand[-1]] = cand
+        self.counts[cand] = 0
+        self.items.update(cand)
+        self.k = len(cand)
+
+    def countRow(self,row,count=1):
+        """ adds count to every candidate contained in row """
+        if self.k == 0:
+            return
+        items = sorted(self.items.intersection(row))
+        if len(items) >= self.k:
+            self._countFrom(self.root,items,0,1,count)
+
+    def _countFrom(self,node,items,start,depth,count):
+        # leave room for the k - depth items still needed below child
+        stop = len(items) - (self.k - depth)
+        for i in xrange(start,stop):
+            child = node.get(items[i])
+            if child is None:
+                continue
+            if depth == self.k:
+                self.counts[child] += count
+            else:
+                self._countFrom(child,items,i+1,depth+1,count)
 
 def aprioriCandidatePatterns(ds,min_sup,prevCands=None):
     """ given dataset ds, min_sup, and prevCands, find next candidates """
-    log.debug('called')
-    if len(prevCands) == 0:
-        return []
-    if prevCands == None:
-        prevCands = [[]]
-    k = len(prevCands[0]) + 1
-    items = map(lambda x: [x],set(reduce(lambda x,y: x+y, prevCands)))
-    cands = []
-    for prevCand in prevCands:
-        for item in items:
-            if item[0] not in prevCand:
-                cands.append(prevCand + item)
-    log.debug('generated {0} k={1} candidates'.format(len(cands),k))
-    cands = list(set(map(lambda x: str(sort(x)),cands)))
-    cands = map(lambda x: eval(x),cands)
-    log.debug('generated {0} k={1} canonical candidates'.format(len(cands),k))
-    counts = dict()
-    for row in ds:
-        rowCounts = countCandidates(row,cands)
-        counts = mergeCounts(counts,rowCounts)
-    log.debug('counted candidate pattern occurrences')
-    keys = counts.keys()
-    keys = filter(lambda x: counts[x] >= min_sup,keys)
-    candidates = map(lambda x: eval(x),keys)
-    log.debug('found {0} k={1} patterns'.format(len(candidates),k))
-    return candidates
-
-def aprioriPatterns(ds,k,min_sup=0):
+    # returns a dict(candidate tuple -> support) of frequent candidates
+    if not prevCands:
+        return dict()
+    with phase('apriori.gen'):
+        cands = aprioriGen(prevCands)
+    with phase('apriori.count'):
+        trie = CandidateTrie(cands)
+        for (row,weight) in weightedRows(ds):
+            trie.countRow(row,weight)
+    return supportFilter(trie.counts,min_sup)
+
+@decodesLabels
+def iterAprioriPatterns(ds,k,min_sup=0,workers=1,supports=None,kmin=None,
+                        engine='rows'):
+    """ yields the (pattern,support) of the frequent kmin..k-patterns of ds """
+    # each level is yielded as soon as it is counted.  if a supports
+    # dict is given, the frequent patterns of every level up to k are
+    # also added to it.  the numpy engine counts over a transaction
+    # matrix instead of row by row
+    if kmin == None:
+        kmin = k
+    if engine == 'numpy':
+        if workers > 1:
+            raise ValueError('the numpy engine runs in a single process')
+        for found in iterMatrixAprioriPatterns(ds,k,min_sup,supports,kmin):
+            yield found
+        return
+    if engine != 'rows':
+        raise ValueError('unknown engine {0}'.format(engine))
+    if workers > 1:
+        for found in iterParallelAprioriPatterns(ds,k,min_sup,workers,
+                                                 supports,kmin):
+            yield found
+        return
+    with phase('apriori.count'):
+        counts = countDatasetItems(ds)
+    candidates = dict(((item,),count) for (item,count) in counts.iteritems()
+                      if count >= min_sup)
+    for i in range(1,k+1):
+        if i > 1:
+            candidates = aprioriCandidatePatterns(ds,min_sup,candidates)
+        if supports != None:
+            supports.update(candidates)
+        if i >= kmin:
+            for found in candidates.iteritems():
+                yield found
+        if len(candidates) == 0:
+            break
+
+def aprioriPatterns(ds,k,min_sup=0,workers=1,supports=None,kmin=None,
+                    engine='rows'):
     """ given dataset ds, find frequent k-patterns with min support min_sup """
+    # with kmin, the patterns of every length from kmin to k are found
+    # in the same pass
     log.info('called')
-    counts = dict()
+    if kmin == None:
+        kmin = k
+    patterns = dict(iterAprioriPatterns(ds,k,min_sup,workers,supports,kmin,
+                                        engine))
+    log.info('found {0} k={1}..{2} patterns'.format(len(patterns),kmin,k))
+    return patterns
+
+######################################################################
+# Parallel Apriori
+######################################################################
+# Count distribution: the rows are recoded to item ids and copied once
+# into shared memory, where each worker process owns a contiguous
+# shard of them.  At every level the candidates are sent to all the
+# workers, each counts them over its own shard with a CandidateTrie,
+# and the coordinator sums the counts and generates the next level.
+# The transactions themselves are never pickled.
+######################################################################
+
+_workerItems = None
+_workerOffsets = None
+
+def _initAprioriWorker(items,offsets):
+    global _workerItems, _workerOffsets
+    _workerItems = items
+    _workerOffsets = offsets
+
+def _shardRows(start,end):
+    items = _workerItems
+    offsets = _workerOffsets
+    for i in xrange(start,end):
+        yield items[offsets[i]:offsets[i+1]]
+
+def _countShardItems(args):
+    (start,end) = args
+    return countDatasetItems(_shardRows(start,end))
+
+def _countShardCandidates(args):
+    (start,end,cands) = args
+    trie = CandidateTrie(cands)
+    for row in _shardRows(start,end):
+        trie.countRow(row)
+    return map(lambda x: trie.counts[x],cands)
+
+def shareDataset(ds):
+    """ recodes ds to shared item ids, returns (labels,items,offsets) """
+    labels = []
+    itemIds = dict()
+    items = array('i')
+    offsets = array('l',[0])
     for row in ds:
-        rowCounts = countItems(row)
-        counts = mergeCounts(counts,rowCounts)
-    keys = counts.keys()
-    keys = filter(lambda x: counts[x] >= min_sup,keys)
-    candidates = map(lambda x: [x], keys)
-    log.debug('generated {0} k=1 candidates'.format(len(candidates)))
-    for i in range(1,k):
-        candidates = aprioriCandidatePatterns(ds,min_sup,candidates)
-    log.info('found {0} k={1} patterns'.format(len(candidates),k))
-    return candidates
+        for item in row:
+            if item not in itemIds:
+                itemIds[item] = len(labels)
+                labels.append(item)
+            items.append(itemIds[item])
+        offsets.append(len(items))
+    return (labels,RawArray('i',items),RawArray('l',offsets))
+
+def iterParallelAprioriPatterns(ds,k,min_sup,workers,supports=None,
+                                kmin=None):
+    """ iterAprioriPatterns, with each level counted by worker processes """
+    (labels,items,offsets) = shareDataset(ds)
+    bounds = map(lambda x: x * (len(offsets) - 1) // workers,range(workers+1))
+    shards = zip(bounds[:-1],bounds[1:])
+
+    if kmin == None:
+        kmin = k
+    pool = Pool(workers,_initAprioriWorker,(items,offsets))
+    try:
+        counts = dict()
+        for shardCounts in pool.map(_countShardItems,shards):
+            for (item,count) in shardCounts.iteritems():
+                counts[item] = counts.get(item,0) + count
+        candidates = dict(((item,),count)
+                          for (item,count) in counts.iteritems()
+                          if count >= min_sup)
+        for i in range(1,k+1):
+            if i > 1:
+                cands = aprioriGen(candidates)
+                totals = [0] * len(cands)
+                tasks = map(lambda x: x + (cands,),shards)
+                for shardCounts in pool.map(_countShardCandidates,tasks):
+                    totals = map(add,totals,shardCounts)
+                candidates = supportFilter(dict(zip(cands,totals)),min_sup)
+            if supports != None or i >= kmin:
+                patterns = decodePatterns(candidates,labels)
+            if supports != None:
+                supports.update(patterns)
+            if i >= kmin:
+                for found in patterns.iteritems():
+                    yield found
+            if len(candidates) == 0:
+                break
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def parallelAprioriPatterns(ds,k,min_sup,workers,supports=None,kmin=None):
+    """ aprioriPatterns, with each level counted by worker processes """
+    return dict(iterParallelAprioriPatterns(ds,k,min_sup,workers,supports,
+                                            kmin))
+
+def decodePatterns(patterns,labels):
+    """ maps patterns of item ids back to sorted tuples of labels """
+    return dict((tuple(sorted(map(lambda x: labels[x],pattern))),support)
+                for (pattern,support) in patterns.iteritems())
+
+######################################################################
+# Vectorized Apriori
+######################################################################
+# Dense datasets such as chess and mushroom have a few hundred items
+# over thousands of rows, so they fit in a boolean matrix X with a row
+# per transaction and a column per item, and NumPy can count over it
+# a whole level at a time:
+#   level 1 is the column sums of X
+#   level 2 is the upper triangle of X^T X
+#   level k > 2 ANDs together the columns of each candidate, with the
+#   columns packed 8 rows to a byte and a block of candidates at a time
+# Columns follow the sorted items, so sorted tuples of columns decode
+# to sorted patterns.  NumPy is optional; only this engine needs it.
+######################################################################
+
+MATRIX_BLOCK_BYTES = 1 << 24
+
+if numpy != None:
+    POPCOUNT = numpy.array([bin(x).count('1') for x in range(256)],
+                           dtype=numpy.uint8)
+
+def transactionMatrix(ds):
+    """ returns (sorted item labels, boolean rows x items matrix of ds) """
+    itemIds = dict()
+    rowIds = array('l')
+    colIds = array('l')
+    n = 0
+    for row in ds:
+        for item in set(row):
+            if item not in itemIds:
+                itemIds[item] = len(itemIds)
+            rowIds.append(n)
+            colIds.append(itemIds[item])
+        n += 1
+    labels = sorted(itemIds.keys())
+    ranks = numpy.empty(len(labels),dtype=numpy.int64)
+    ranks[map(lambda x: itemIds[x],labels)] = numpy.arange(len(labels))
+    X = numpy.zeros((n,len(labels)),dtype=bool)
+    if len(rowIds) > 0:
+        X[numpy.frombuffer(rowIds,dtype='l'),
+          ranks[numpy.frombuffer(colIds,dtype='l')]] = True
+    return (labels,X)
+
+def countMatrixCandidates(columns,cands):
+    """ counts the tuples cands of column ids over packed columns """
+    counts = numpy.empty(len(cands),dtype=numpy.int64)
+    block = max(1,MATRIX_BLOCK_BYTES // max(1,columns.shape[1]))
+    for start in xrange(0,len(cands),block):
+        ids = numpy.array(cands[start:start+block],dtype=numpy.int64)
+        acc = columns[ids[:,0]]
+        for j in xrange(1,ids.shape[1]):
+            numpy.bitwise_and(acc,columns[ids[:,j]],acc)
+        counts[start:start+len(ids)] = POPCOUNT[acc].sum(axis=1)
+    return counts
+
+def iterMatrixAprioriPatterns(ds,k,min_sup=0,supports=None,kmin=None):
+    """ iterAprioriPatterns, counting each level over a transaction matrix """
+    if numpy == None:
+        raise ImportError('the numpy engine of Apriori needs numpy')
+    if kmin == None:
+        kmin = k
+    with phase('apriori.count'):
+        (labels,X) = transactionMatrix(ds)
+        itemCounts = X.sum(axis=0)
+    frequent = numpy.flatnonzero(itemCounts >= min_sup)
+    X = X[:,frequent]
+    labels = map(lambda x: labels[x],frequent)
+    candidates = dict(((i,),int(itemCounts[c]))
+                      for (i,c) in enumerate(frequent))
+    columns = None
+    for i in range(1,k+1):
+        if i == 2:
+            with phase('apriori.count'):
+                # float products go through BLAS and are exact this small
+                pairCounts = numpy.dot(X.T.astype(numpy.float64),
+                                       X.astype(numpy.float64))
+            (first,second) = numpy.triu_indices(len(labels),1)
+            counts = pairCounts[first,second]
+            keep = numpy.flatnonzero(counts >= min_sup)
+            candidates = dict(((int(first[j]),int(second[j])),int(counts[j]))
+                              for j in keep)
+            if stats != None:
+                stats.count('apriori.candidates',len(first))
+        elif i > 2:
+            with phase('apriori.gen'):
+                cands = aprioriGen(candidates)
+            with phase('apriori.count'):
+                if columns is None:
+                    columns = numpy.packbits(X,axis=0).T.copy()
+                counts = countMatrixCandidates(columns,cands)
+            candidates = dict((cands[j],int(counts[j]))
+                              for j in numpy.flatnonzero(counts >= min_sup))
+        if supports != None or i >= kmin:
+            patterns = decodePatterns(candidates,labels)
+        if supports != None:
+            supports.update(patterns)
+        if i >= kmin:
+            for found in patterns.iteritems():
+                yield found
+        if len(candidates) == 0:
+            break
 
 ######################################################################
 # FP-Growth
@@ -187,12 +572,12 @@ class FPTree(object):
             node = node.children[0]
         return True
 
-    def addItemset(self,node,itemset):
+    def addItemset(self,node,itemset,count=1):
         for item in itemset:
             # loop invariant: node is the child's parent
-            child = FPTreeNode(item,1,node)
+            child = FPTreeNode(item,count,node)
             self.registerNode(item,child)
-            self.incItemCount(item)
+            self.incItemCount(item,count)
             node.addChild(child)
             node = child
 
@@ -210,24 +595,37 @@ class FPTree(object):
         else:
             itemNodes[item] = [node]
 
-    def getConditionalPatternBase(self,item):
-        base = []
-        itemNodes = self.itemNodes
-        if item not in itemNodes:
-            return base
-        for node in itemNodes[item]:
+    def iterItemNodes(self,item):
+        """ iterates over the nodes holding item """
+        return iter(self.itemNodes.get(item,()))
+
+    def iterPrefixPaths(self,item):
+        """ yields (prefix path, count) for each node holding item """
+        for node in self.itemNodes.get(item,()):
             prefixPath = node.prefixPath()
-            if len(prefixPath) == 0:
-                continue
-            for _ in range(node.count):
-                base.append(prefixPath)
-        return base
+            if len(prefixPath) > 0:
+                yield (prefixPath,node.count)
+
+    def conditionalItemCounts(self,item):
+        """ counts the items above each node holding item, by its count """
+        counts = dict()
+        for node in self.itemNodes.get(item,()):
+            count = node.count
+            node = node.parent
+            while node.item != None:
+                counts[node.item] = counts.get(node.item,0) + count
+                node = node.parent
+        return counts
+
+    def getConditionalPatternBase(self,item):
+        """ returns the (prefix path, count) pairs of item """
+        return list(self.iterPrefixPaths(item))
 
-    def updateItemset(self,itemset):
+    def updateItemset(self,itemset,count=1):
         """ takes a list of items, adds or updates a path in tree """
 
         node = self.root
-        node.incCount()
+        node.incCount(count)
         for (i,item) in enumerate(itemset):
             # loop invariant: node is a valid FPTreeNode
             children = node.children
@@ -238,114 +636,418 @@ class FPTree(object):
                     node = child
                     break
             if node == None:
-                self.addItemset(last,itemset[i:])
+                self.addItemset(last,itemset[i:],count)
                 return
             else:
-                node.incCount()
-                self.incItemCount(item)
+                node.incCount(count)
+                self.incItemCount(item,count)
 
-def sortByFreq(l,counts,reverse=True):
-    return sorted(l,key=lambda x: counts[x],reverse=reverse)
-    
-def buildFPTree(ds,min_sup):
-    log.debug('called on ds with {0} elements'.format(len(ds)))
+    def nodeCount(self):
+        return sum(map(len,self.itemNodes.values()))
 
-    log.debug('counting elements')
-    counts = dict()
-    for row in ds:
-        rowCounts = countItems(row)
-        counts = mergeCounts(counts,rowCounts)
-    log.debug('counted {0} elements'.format(len(counts)))
+######################################################################
+# Array-backed FP-Tree
+######################################################################
+# The same tree as FPTree, but with no per-node objects.  Node i is
+# described by slot i of four parallel integer arrays: its item id,
+# its count, its parent and its node-link (the next node holding the
+# same item).  Node 0 is the root.  Children are found through one
+# dict keyed on (parent, item id) packed into a single int, so a child
+# lookup is a hash probe rather than a scan of a child list.
+######################################################################
+
+class ArrayFPTree(object):
+    CHILD_KEY_SHIFT = 32
+
+    def __init__(self):
+        self.items = []
+        self.itemIds = dict()
+        self.headers = array('i')
+        self.item = array('i',[-1])
+        self.count = array('i',[0])
+        self.parent = array('i',[-1])
+        self.link = array('i',[-1])
+        self.hasChild = bytearray(1)
+        self.children = dict()
+        self.itemCounts = dict()
+        self.branched = False
+
+    def __len__(self):
+        return self.count[0]
 
-    log.debug('finding the frequent elements')
+    def __str__(self):
+        return self.gvString()
+
+    def gvNodeName(self,node):
+        return 'fp_node_{0}'.format(node)
+
+    def gvString(self):
+        s = "digraph{\n"
+        items = self.items
+        for node in xrange(len(self.item)):
+            item = items[self.item[node]] if node > 0 else None
+            s += '{0} [label="({1}:{2})"];\n'.\
+                format(self.gvNodeName(node),item,self.count[node])
+            if node > 0:
+                s += '{0} -> {1};\n'.\
+                    format(self.gvNodeName(self.parent[node]),
+                           self.gvNodeName(node))
+        return s + "}\n"
+
+    def isSinglePath(self):
+        return not self.branched
+
+    def nodeCount(self):
+        return len(self.item) - 1
+
+    def itemId(self,item):
+        iid = self.itemIds.get(item)
+        if iid is None:
+            iid = len(self.items)
+            self.items.append(item)
+            self.itemIds[item] = iid
+            self.headers.append(-1)
+        return iid
+
+    def addNode(self,iid,parent):
+        node = len(self.item)
+        self.item.append(iid)
+        self.count.append(0)
+        self.parent.append(parent)
+        self.link.append(self.headers[iid])
+        self.headers[iid] = node
+        self.hasChild.append(0)
+        if self.hasChild[parent]:
+            self.branched = True
+        self.hasChild[parent] = 1
+        self.children[parent << self.CHILD_KEY_SHIFT | iid] = node
+        return node
+
+    def prefixPath(self,node):
+        path = deque()
+        items = self.items
+        node = self.parent[node]
+        while node > 0:
+            path.appendleft(items[self.item[node]])
+            node = self.parent[node]
+        return list(path)
+
+    def iterItemNodes(self,item):
+        """ yields the nodes holding item by following its node-links """
+        if item not in self.itemIds:
+            return
+        node = self.headers[self.itemIds[item]]
+        while node >= 0:
+            yield node
+            node = self.link[node]
+
+    def iterPrefixPaths(self,item):
+        """ yields (prefix path, count) for each node holding item """
+        for node in self.iterItemNodes(item):
+            prefixPath = self.prefixPath(node)
+            if len(prefixPath) > 0:
+                yield (prefixPath,self.count[node])
+
+    def conditionalItemCounts(self,item):
+        """ counts the items above each node holding item, by its count """
+        counts = dict()
+        items = self.items
+        itemIds = self.item
+        parent = self.parent
+        for node in self.iterItemNodes(item):
+            count = self.count[node]
+            node = parent[node]
+            while node > 0:
+                above = items[itemIds[node]]
+                counts[above] = counts.get(above,0) + count
+                node = parent[node]
+        return counts
+
+    def getConditionalPatternBase(self,item):
+        """ returns the (prefix path, count) pairs of item """
+        return list(self.iterPrefixPaths(item))
+
+    def updateItemset(self,itemset,count=1):
+        """ takes a list of items, adds or updates a path in tree """
+        counts = self.count
+        itemCounts = self.itemCounts
+        node = 0
+        counts[node] += count
+        for item in itemset:
+            iid = self.itemId(item)
+            child = self.children.get(node << self.CHILD_KEY_SHIFT | iid)
+            if child is None:
+                child = self.addNode(iid,node)
+            counts[child] += count
+            itemCounts[item] = itemCounts.get(item,0) + count
+            node = child
+
+def sortByFreq(l,counts,reverse=True):
+    # most frequent first, or with reverse=False the exact opposite.
+    # ties are broken on the item itself so that every row, and every
+    # conditional tree, sees the same total order, and the recoded
+    # rows of a PreprocessedDataset, sorted by id, are already in it
+    return sorted(l,key=lambda x: (-counts[x],x),reverse=not reverse)
+    
+def buildFPTree(ds,min_sup,fptreeClass=FPTree):
+    counts = countDatasetItems(ds)
     freqElmnts = set(filter(lambda x: counts[x] >= min_sup,counts.keys()))
-    log.debug('found {0} frequent elements'.format(len(freqElmnts)))
 
-    log.debug('building FP-Tree')
-    fptree = FPTree()
-    for row in ds:
-        rowSet = set(row)
-        freqItems = sortByFreq(list(rowSet & freqElmnts),counts)
-        fptree.updateItemset(freqItems)
-    log.debug('built FP-Tree with {0} support'.format(fptree.root.count))
-    log.debug('root node has {0} children'.format(len(fptree.root.children)))
-    log.debug('FP-Tree is a single path? {0}'.format(fptree.isSinglePath()))
+    fptree = fptreeClass()
+    if hasattr(ds,'__IS_PREPROCESSED__'):
+        # item ids already run from most to least frequent, and each
+        # row is sorted by id, so there is nothing left to sort
+        for (row,weight) in weightedRows(ds):
+            fptree.updateItemset([x for x in row if x in freqElmnts],weight)
+    else:
+        for row in ds:
+            rowSet = set(row)
+            freqItems = sortByFreq(list(rowSet & freqElmnts),counts)
+            fptree.updateItemset(freqItems)
+    if stats != None:
+        stats.count('fpgrowth.trees')
+        stats.count('fpgrowth.nodes',fptree.nodeCount())
     return fptree
 
-def combsOfSize(l,k):
-    if k > len(l):
-        return []
-    return [list(val) for val in combinations(l,k)]
+def buildConditionalFPTree(fptree,item,min_sup):
+    """ builds the conditional FP-Tree of item straight from fptree """
+    # the prefix paths are walked twice through the node-links, once to
+    # weigh their items and once to insert them with their counts, so
+    # the conditional pattern base itself is never materialized
+    counts = fptree.conditionalItemCounts(item)
+    freqElmnts = set(filter(lambda x: counts[x] >= min_sup,counts.keys()))
+    cfpt = fptree.__class__()
+    for (prefixPath,count) in fptree.iterPrefixPaths(item):
+        freqItems = sortByFreq(filter(lambda x: x in freqElmnts,prefixPath),
+                               counts)
+        cfpt.updateItemset(freqItems,count)
+    if stats != None:
+        stats.count('fpgrowth.trees')
+        stats.count('fpgrowth.nodes',cfpt.nodeCount())
+    return cfpt
 
-def mineFPTree(fptree,k,min_sup):
-    log.debug('called')
-    patterns = []
+def iterFPTreePatterns(fptree,k,min_sup,kmin=None):
+    """ yields the (pattern,support) of the kmin..k-patterns of fptree """
+    # kmin defaults to k, for the k-patterns alone
+    if kmin == None:
+        kmin = k
+    kmin = max(kmin,1)
 
     # base case: fptree has a single path
     if fptree.isSinglePath():
-        log.debug('fptree has one path')
         counts = fptree.itemCounts
         candidatePatterns = filter(lambda x: counts[x] >= min_sup,\
                                        counts.keys())
-        log.debug('{0} items have at least min_sup'.\
-                     format(len(candidatePatterns)))
-        candidatePatterns = combsOfSize(candidatePatterns,k)
-        log.debug('generated {0} candidate patterns'.\
-                     format(len(candidatePatterns)))
-        for cand in candidatePatterns:
-            if len(cand) < k:
-                continue
-            patterns.append(cand)
-        log.debug('filtered candidates down to {0} patterns'.\
-                     format(len(patterns)))
-        return patterns
+        # along a single path a pattern is as frequent as its rarest item
+        for length in range(kmin,k+1):
+            for cand in combinations(sorted(candidatePatterns),length):
+                yield (cand,min(map(lambda x: counts[x],cand)))
+        return
 
-    log.debug('fptree has many paths')
-    log.debug('building item list sorted by frequency ascending')
     counts = fptree.itemCounts
-    items = counts.keys()
+    items = filter(lambda x: counts[x] >= min_sup,counts.keys())
     items = sortByFreq(items,counts,False)
-    log.debug('found {0} items'.format(len(items)))
-    log.debug('first item: {0}, frequency: {1}'.\
-                 format(items[0],counts[items[0]]))
 
-    if k == 1:
-        return map(lambda x: [x],items)
-    
+    # no pattern here can be longer than the number of frequent items
+    if len(items) < kmin:
+        return
+
     for item in items:
-        cpb = fptree.getConditionalPatternBase(item)
-        log.debug('conditional pattern base for {0} has {1} rows'.\
-                     format(item,len(cpb)))
-    
-        cfpt = buildFPTree(cpb,min_sup)
-        log.debug('generated conditional FP-Tree with {0} support'.\
-                     format(len(cfpt)))
-
-        cfp = mineFPTree(cfpt,k-1,min_sup)
-        log.debug('mined FP-Tree')
-        for fp in cfp:
-            pattern = fp + [item]
-            if pattern not in patterns:
-                patterns.append(pattern)
-        log.debug('generated {0} new patterns ending in {1}'.\
-                     format(len(cfp),item))
-    log.debug('generated {0} patterns'.format(len(patterns)))
-    return patterns
+        for found in iterItemFPTreePatterns(fptree,item,k,min_sup,kmin):
+            yield found
 
-def fpGrowthPatterns(ds,k,min_sup=0):
-    log.info('called')
-    log.debug('called on ds with {0} elements'.format(len(ds)))
-    
-    log.debug('building FP-Tree')
-    fptree = buildFPTree(ds,min_sup)
-    log.debug('FP-Tree built')
+def mineFPTree(fptree,k,min_sup,kmin=None):
+    """ returns a dict(pattern tuple -> support) of the kmin..k-patterns """
+    return dict(iterFPTreePatterns(fptree,k,min_sup,kmin))
 
-    log.debug('running FP-Growth on FP-Tree')
-    patterns = mineFPTree(fptree,k,min_sup)
-    log.info('found {0} k={1} patterns'.format(len(patterns),k))
+def iterItemFPTreePatterns(fptree,item,k,min_sup,kmin=None):
+    """ yields the (pattern,support) of the kmin..k-patterns with item """
+    # only the items above item in fptree are considered, so across all
+    # the items of fptree every pattern is found exactly once.  the
+    # conditional tree is only built while longer patterns are wanted
+    if kmin == None:
+        kmin = k
+    if kmin <= 1 and k >= 1:
+        yield ((item,),fptree.itemCounts[item])
+    if k <= 1:
+        return
 
+    cfpt = buildConditionalFPTree(fptree,item,min_sup)
+    if stats != None:
+        stats.enter()
+    try:
+        for (fp,support) in iterFPTreePatterns(cfpt,k-1,min_sup,kmin-1):
+            yield (tuple(sorted(fp + (item,))),support)
+    finally:
+        if stats != None:
+            stats.leave()
+
+def mineItemFPTree(fptree,item,k,min_sup,kmin=None):
+    """ returns a dict(pattern tuple -> support) of item's kmin..k-patterns """
+    return dict(iterItemFPTreePatterns(fptree,item,k,min_sup,kmin))
+
+######################################################################
+# Parallel FP-Growth
+######################################################################
+# The items of the FP-Tree are mined independently of each other, so
+# they are shared out across a pool of worker processes.  Each worker
+# receives the tree once, when it starts, and then only item names go
+# back and forth.  A few items carry most of the work, so items are
+# handed out one at a time, largest estimated conditional base first,
+# to whichever worker is free.
+######################################################################
+
+_workerFPTree = None
+
+def _initFPTreeWorker(fptree):
+    global _workerFPTree
+    _workerFPTree = fptree
+
+def _mineWorkerItem(args):
+    (item,k,min_sup,kmin) = args
+    return mineItemFPTree(_workerFPTree,item,k,min_sup,kmin)
+
+def conditionalBaseSize(fptree,item):
+    """ the number of nodes on the prefix paths of item, a cost estimate """
+    return sum(map(lambda x: len(x[0]),fptree.iterPrefixPaths(item)))
+
+def iterParallelFPTreePatterns(fptree,k,min_sup,workers,kmin=None):
+    """ iterFPTreePatterns, mining the items of fptree in worker processes """
+    # the patterns of each item are yielded as soon as its worker is done
+    if k == 1 or fptree.isSinglePath():
+        for found in iterFPTreePatterns(fptree,k,min_sup,kmin):
+            yield found
+        return
+
+    counts = fptree.itemCounts
+    items = filter(lambda x: counts[x] >= min_sup,counts.keys())
+    items.sort(key=lambda x: conditionalBaseSize(fptree,x),reverse=True)
+    tasks = map(lambda x: (x,k,min_sup,kmin),items)
+
+    pool = Pool(workers,_initFPTreeWorker,(fptree,))
+    try:
+        for itemPatterns in pool.imap_unordered(_mineWorkerItem,tasks):
+            for found in itemPatterns.iteritems():
+                yield found
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def parallelMineFPTree(fptree,k,min_sup,workers,kmin=None):
+    """ mineFPTree, with the items of fptree mined by worker processes """
+    return dict(iterParallelFPTreePatterns(fptree,k,min_sup,workers,kmin))
+
+@decodesLabels
+def iterFPGrowthPatterns(ds,k,min_sup=0,fptreeClass=FPTree,workers=1,
+                         kmin=None):
+    """ yields the (pattern,support) of the kmin..k-patterns of ds """
+    # the mine phase includes the time the caller spends between patterns
+    with phase('fpgrowth.build'):
+        fptree = buildFPTree(ds,min_sup,fptreeClass)
+
+    if workers > 1:
+        patterns = iterParallelFPTreePatterns(fptree,k,min_sup,workers,kmin)
+    else:
+        patterns = iterFPTreePatterns(fptree,k,min_sup,kmin)
+    with phase('fpgrowth.mine'):
+        for found in patterns:
+            yield found
+
+def fpGrowthPatterns(ds,k,min_sup=0,fptreeClass=FPTree,workers=1,kmin=None):
+    log.info('called')
+    if kmin == None:
+        kmin = k
+    patterns = dict(iterFPGrowthPatterns(ds,k,min_sup,fptreeClass,workers,
+                                         kmin))
+    log.info('found {0} k={1}..{2} patterns'.format(len(patterns),kmin,k))
     return patterns
 
+######################################################################
+# Incremental FP-Tree (CanTree)
+######################################################################
+# buildFPTree drops infrequent items and orders rows by frequency, so
+# it has to see all of the data first.  A CanTree instead keeps every
+# item, in a canonical order that never changes as rows arrive: the
+# frequency order of the first batch, with items first seen later
+# appended after it.  New batches are inserted into the existing
+# tree, and mineFPTree mines it directly, skipping the items below
+# min_sup, with the same results as a rebuild from all the rows.  As
+# frequencies drift the order can be refreshed with restructure,
+# which rebuilds the tree from its own paths rather than the rows.
+#
+# Rows can also be removed again, which drops the nodes and items
+# whose counts reach zero, so the tree only ever holds the rows
+# currently in it.
+######################################################################
+
+class CanTree(FPTree):
+    def __init__(self):
+        FPTree.__init__(self)
+        self.order = dict()
+        self.nextRank = 0
+
+    def canonicalOrder(self,items,counts):
+        for item in sortByFreq(items,counts):
+            if item not in self.order:
+                self.order[item] = self.nextRank
+                self.nextRank += 1
+
+    def sortItemset(self,itemset):
+        order = self.order
+        return sorted(itemset,key=lambda x: order[x])
+
+    def addTransactions(self,rows):
+        """ inserts a batch of rows into the tree """
+        rows = map(set,rows)
+        new = set()
+        for row in rows:
+            new.update(filter(lambda x: x not in self.order,row))
+        if len(new) > 0:
+            self.canonicalOrder(new,countDatasetItems(rows))
+        for row in rows:
+            self.updateItemset(self.sortItemset(row))
+
+    def removeItemset(self,itemset,count=1):
+        """ takes a sorted itemset already in the tree, removes count of it """
+        node = self.root
+        node.incCount(-count)
+        for item in itemset:
+            for child in node.children:
+                if child.item == item:
+                    break
+            child.incCount(-count)
+            self.incItemCount(item,-count)
+            if child.count == 0:
+                node.children.remove(child)
+                self.itemNodes[item].remove(child)
+                if len(self.itemNodes[item]) == 0:
+                    del self.itemNodes[item]
+            if self.itemCounts[item] == 0:
+                del self.itemCounts[item]
+                del self.order[item]
+            node = child
+
+    def iterTransactions(self):
+        """ yields (itemset, count) for the rows ending at each node """
+        stack = [(self.root,[])]
+        while len(stack) > 0:
+            (node,path) = stack.pop()
+            ending = node.count - sum(map(lambda x: x.count,node.children))
+            if ending > 0:
+                yield (path,ending)
+            for child in node.children:
+                stack.append((child,path + [child.item]))
+
+    def restructure(self):
+        """ rebuilds the tree in the current frequency order of its items """
+        transactions = list(self.iterTransactions())
+        counts = self.itemCounts
+        CanTree.__init__(self)
+        self.canonicalOrder(counts.keys(),counts)
+        for (itemset,count) in transactions:
+            self.updateItemset(self.sortItemset(itemset),count)
+
 ######################################################################
 # Eclat
 ######################################################################
@@ -358,30 +1060,537 @@ def fpGrowthPatterns(ds,k,min_sup=0):
 # simply the cardinality of the intersection of the tidsets of the
 # items.
 #
-# To find all the k-patterns on a dataset, Eclat simply iterates over
-# all k-combinations of items and for each it checks the cardinality
-# of the intersection of the items in the combination.  If the
-# cardinality is at least the minimum support, it reports the pattern.
+# Eclat searches depth first through prefix equivalence classes: all
+# the patterns sharing a prefix P are extended by joining P's members
+# pairwise, so each intersection reuses the tidsets of its parents and
+# a branch is abandoned as soon as it falls below the minimum support.
+#
+# On dense datasets tidsets are nearly full, so dEclat instead keeps
+# the diffset of each pattern, the tids of its prefix it is missing:
+#   d(PX) = t(P) - t(X)  and  d(PXY) = d(PY) - d(PX)
+# with support(PXY) = support(PX) - |d(PXY)|.
+######################################################################
+
+def eclatExtend(vds,prefix,klass,k,min_sup,
+                diffsets=False,isDiff=False,kmin=None):
+    """ extends the prefix class klass of (item,tids,support) depth first """
+    # the (pattern,support) of patterns of kmin..k items are yielded,
+    # and the search stops at k
+    if kmin == None:
+        kmin = k
+    for (i,(item,tids,support)) in enumerate(klass):
+        pattern = prefix + (item,)
+        if len(pattern) >= kmin:
+            yield (tuple(sorted(pattern)),support)
+        if len(pattern) >= k:
+            continue
+        if stats != None:
+            stats.count('eclat.tidsets',len(klass) - i - 1)
+        children = []
+        for (other,otherTids,_) in klass[i+1:]:
+            if not diffsets:
+                childTids = vds.intersect(tids,otherTids)
+                childSupport = vds.support(childTids)
+            elif isDiff:
+                childTids = vds.difference(otherTids,tids)
+                childSupport = support - vds.support(childTids)
+            else:
+                childTids = vds.difference(tids,otherTids)
+                childSupport = support - vds.support(childTids)
+            if childSupport >= min_sup:
+                children.append((other,childTids,childSupport))
+        if len(children) == 0:
+            continue
+        if stats != None:
+            stats.enter()
+        try:
+            for found in eclatExtend(vds,pattern,children,k,min_sup,
+                                     diffsets,diffsets,kmin):
+                yield found
+        finally:
+            if stats != None:
+                stats.leave()
+
+def verticalDataset(ds):
+    """ returns ds itself if it is vertical, else a vertical copy of it """
+    if hasattr(ds,'__IS_VERTICAL__'):
+        return ds
+    vds = VerticalDataset()
+    vds.readFromDataset(ds)
+    return vds
+
+@decodesLabels
+def iterEclatPatterns(vds,k,min_sup=0,diffsets=False,kmin=None):
+    """ yields the (pattern,support) of the kmin..k-patterns of vds """
+    # the mine phase includes the time the caller spends between patterns
+    with phase('eclat.vertical'):
+        vds = verticalDataset(vds)
+
+    # rarest items first keeps the classes deeper in the search small
+    tidsets = vds.tidsets
+    supports = dict((item,vds.support(tidsets[item]))
+                    for item in tidsets.keys())
+    items = sortByFreq(filter(lambda x: supports[x] >= min_sup,
+                              supports.keys()),supports,False)
+    klass = map(lambda x: (x,tidsets[x],supports[x]),items)
+
+    if k > 0:
+        with phase('eclat.mine'):
+            for found in eclatExtend(vds,(),klass,k,min_sup,diffsets,False,
+                                     kmin):
+                yield found
+
+def eclatPatterns(vds,k,min_sup=0,diffsets=False,kmin=None):
+    log.info('called')
+    if kmin == None:
+        kmin = k
+    patterns = dict(iterEclatPatterns(vds,k,min_sup,diffsets,kmin))
+    log.info('found {0} k={1}..{2} patterns'.format(len(patterns),kmin,k))
+    return patterns
+
+######################################################################
+# Top-k Patterns
+######################################################################
+# Rather than a minimum support, ask for the n most frequent patterns
+# (optionally of length k only).  The Eclat search above is run with
+# the most frequent items first and a min-heap of the best n patterns
+# found so far.  Once the heap is full its smallest support becomes
+# the minimum support, which only rises, so branches that can no
+# longer beat it are pruned.  Patterns tied with the n-th support are
+# kept in the order the search meets them.
 ######################################################################
 
-def eclatPatterns(vds,k,min_sup=0):
+class TopPatterns(object):
+    """ the n most frequent patterns seen so far """
+    def __init__(self,n):
+        self.n = n
+        self.heap = []
+
+    def threshold(self):
+        """ a pattern must have more than this support to get in """
+        if len(self.heap) < self.n:
+            return 0
+        return self.heap[0][0]
+
+    def add(self,pattern,support):
+        if support <= self.threshold():
+            return
+        entry = (support,tuple(sorted(pattern)))
+        if len(self.heap) < self.n:
+            heappush(self.heap,entry)
+        else:
+            heapreplace(self.heap,entry)
+
+    def patterns(self):
+        return dict((pattern,support) for (support,pattern) in self.heap)
+
+def topKExtend(vds,prefix,klass,k,top):
+    for (i,(item,tids,support)) in enumerate(klass):
+        if support <= top.threshold():
+            continue
+        pattern = prefix + (item,)
+        if len(pattern) > 1 and (k == None or len(pattern) == k):
+            top.add(pattern,support)
+        if len(pattern) == k:
+            continue
+        children = []
+        for (other,otherTids,_) in klass[i+1:]:
+            childTids = vds.intersect(tids,otherTids)
+            childSupport = vds.support(childTids)
+            if childSupport > top.threshold():
+                children.append((other,childTids,childSupport))
+        if len(children) > 0:
+            topKExtend(vds,pattern,children,k,top)
+
+@decodesLabels
+def topKPatterns(vds,n,k=None):
+    """ returns a dict(pattern tuple -> support) of the n most frequent """
     log.info('called')
-    if not hasattr(vds,'__IS_VERTICAL__'):
-        ds = vds
-        vds = VerticalDataset()
-        vds.readFromDataset(ds)
-
-    patterns = []
-    combs = combinations(vds.tidsets.keys(),k)
-    for tup in combs:
-        sets = map(lambda x: vds.tidsets[x],tup)
-        items = reduce(lambda x,y: x & y if len(x & y) >= min_sup else set(),\
-                           sets)
-        if len(items) >= min_sup:
-            patterns.append(list(tup))
+    if n < 0:
+        raise ValueError('can not find {0} top patterns'.format(n))
+    if n == 0:
+        return dict()
+    vds = verticalDataset(vds)
+    tidsets = vds.tidsets
+    supports = dict((item,vds.support(tidsets[item]))
+                    for item in tidsets.keys())
+    items = sortByFreq(supports.keys(),supports)
+    klass = map(lambda x: (x,tidsets[x],supports[x]),items)
+
+    top = TopPatterns(n)
+    if k == None or k == 1:
+        # the single items seed the threshold before any intersection
+        for item in items:
+            top.add((item,),supports[item])
+    if k == None or k > 0:
+        topKExtend(vds,(),klass,k,top)
+    patterns = top.patterns()
+    if hasattr(vds,'__IS_PREPROCESSED__') and vds.min_sup > 0 and \
+            (len(patterns) < n or min(patterns.values()) < vds.min_sup):
+        # a pattern with an item dropped by preprocessing, below its
+        # min_sup, could have made the top n
+        raise ValueError('the top {0} patterns reach below the {1} the '
+                         'dataset was preprocessed with'.\
+                             format(n,vds.min_sup))
+    log.info('found {0} top patterns'.format(len(patterns)))
+    return patterns
+
+######################################################################
+# Closed Patterns (CHARM)
+######################################################################
+# A frequent pattern is closed when no superset of it has the same
+# support; the closed patterns and their supports determine all the
+# others.  CHARM walks the same prefix classes as Eclat, but when two
+# members X and Y of a class are compared it uses how their tidsets
+# relate to skip whole branches:
+#   t(X) = t(Y)  Y is merged into X and dropped from the class
+#   t(X) < t(Y)  Y is merged into X
+#   t(X) > t(Y)  XY replaces Y, in X's child class only
+#   otherwise    XY joins X's child class
+# Merging can leave non-closed patterns behind, which are dropped if a
+# closed superset with the same support was already found.
+######################################################################
+
+def addClosedPattern(vds,closed,itemset,tids,support):
+    """ adds itemset to closed unless a known superset subsumes it """
+    bucket = closed.setdefault((support,vds.tidsetHash(tids)),[])
+    for other in bucket:
+        if other.issuperset(itemset):
+            return
+    bucket.append(itemset)
+
+def charmExtend(vds,klass,min_sup,closed):
+    """ extends a class of (itemset,tids,support), rarest first """
+    removed = set()
+    for (i,(itemset,tids,support)) in enumerate(klass):
+        if i in removed:
+            continue
+        itemset = set(itemset)
+        children = []
+        for j in xrange(i+1,len(klass)):
+            if j in removed:
+                continue
+            (other,otherTids,otherSupport) = klass[j]
+            childTids = vds.intersect(tids,otherTids)
+            childSupport = vds.support(childTids)
+            if childSupport < min_sup:
+                continue
+            if childSupport == support:
+                itemset.update(other)
+                if childSupport == otherSupport:
+                    removed.add(j)
+            else:
+                if childSupport == otherSupport:
+                    removed.add(j)
+                children.append((other,childTids,childSupport))
+        if len(children) > 0:
+            # each child is extended by everything merged into itemset
+            children = map(lambda x: (itemset.union(x[0]),x[1],x[2]),
+                           children)
+            children.sort(key=lambda x: x[2])
+            charmExtend(vds,children,min_sup,closed)
+        addClosedPattern(vds,closed,frozenset(itemset),tids,support)
+
+@decodesLabels
+def closedPatterns(vds,min_sup=0):
+    """ returns a dict(pattern tuple -> support) of closed patterns """
+    log.info('called')
+    vds = verticalDataset(vds)
+    tidsets = vds.tidsets
+    klass = []
+    for item in tidsets.keys():
+        support = vds.support(tidsets[item])
+        if support >= min_sup:
+            klass.append((frozenset([item]),tidsets[item],support))
+    klass.sort(key=lambda x: x[2])
+
+    closed = dict()
+    charmExtend(vds,klass,min_sup,closed)
+    patterns = dict()
+    for ((support,_),bucket) in closed.iteritems():
+        for itemset in bucket:
+            patterns[tuple(sorted(itemset))] = support
+    log.info('found {0} closed patterns'.format(len(patterns)))
+    return patterns
+
+######################################################################
+# Maximal Patterns (FPMax)
+######################################################################
+# A frequent pattern is maximal when none of its supersets is
+# frequent.  FPMax runs FP-Growth, but a conditional tree is only
+# built when its head together with every item that could still join
+# it (its tail) is not already inside a maximal pattern found so far.
+# When a conditional tree is a single path, head plus path is the one
+# maximal candidate it can produce.  Items are taken rarest first, so
+# a candidate not covered by an earlier maximal pattern is maximal.
+######################################################################
+
+class MaximalPatterns(object):
+    """ maximal itemsets indexed by item for subset checks """
+    def __init__(self):
+        self.supports = dict()
+        self.byItem = dict()
+
+    def covers(self,itemset):
+        """ true if itemset is a subset of a known maximal pattern """
+        if len(itemset) == 0:
+            return True
+        # every superset of itemset holds its least indexed item
+        rarest = min(itemset,key=lambda x: len(self.byItem.get(x,())))
+        for other in self.byItem.get(rarest,()):
+            if other.issuperset(itemset):
+                return True
+        return False
+
+    def add(self,itemset,support):
+        itemset = frozenset(itemset)
+        if self.covers(itemset):
+            return
+        self.supports[itemset] = support
+        for item in itemset:
+            self.byItem.setdefault(item,[]).append(itemset)
+
+def fpMaxExtend(fptree,head,headSupport,min_sup,maximal):
+    counts = fptree.itemCounts
+    items = filter(lambda x: counts[x] >= min_sup,counts.keys())
+    if fptree.isSinglePath():
+        support = min(map(lambda x: counts[x],items) + [headSupport])
+        maximal.add(head.union(items),support)
+        return
+
+    for item in sortByFreq(items,counts,False):
+        newHead = head.union([item])
+        tailCounts = fptree.conditionalItemCounts(item)
+        tail = filter(lambda x: tailCounts[x] >= min_sup,tailCounts.keys())
+        if maximal.covers(newHead.union(tail)):
+            continue
+        cfpt = buildConditionalFPTree(fptree,item,min_sup)
+        fpMaxExtend(cfpt,newHead,counts[item],min_sup,maximal)
+
+@decodesLabels
+def maximalPatterns(ds,min_sup=0,fptreeClass=FPTree):
+    """ returns a dict(pattern tuple -> support) of maximal patterns """
+    log.info('called')
+    fptree = buildFPTree(ds,min_sup,fptreeClass)
+    maximal = MaximalPatterns()
+    fpMaxExtend(fptree,frozenset(),len(fptree),min_sup,maximal)
+    patterns = dict((tuple(sorted(itemset)),support)
+                    for (itemset,support) in maximal.supports.iteritems())
+    log.info('found {0} maximal patterns'.format(len(patterns)))
+    return patterns
+
+######################################################################
+# Partition (SON)
+######################################################################
+# A pattern frequent in the whole dataset must be frequent, at the
+# same relative support, in at least one chunk of it.  So the dataset
+# is cut into chunks small enough to mine in memory, each chunk is
+# mined on its own at its share of min_sup with one of the miners
+# above, and the union of the local results is verified with a single
+# counting pass over the whole dataset.
+#
+# A chunk task carries its rows and the name of its miner and returns
+# plain pattern tuples, so the first phase runs in independent worker
+# processes and could equally be shipped to other machines.
+######################################################################
+
+PARTITION_MINERS = {'apriori':aprioriPatterns,
+                    'fpgrowth':fpGrowthPatterns,
+                    'eclat':eclatPatterns}
+
+def datasetChunks(ds,chunkSize):
+    """ yields lists of up to chunkSize consecutive rows of ds """
+    rows = iter(ds)
+    chunk = list(islice(rows,chunkSize))
+    while len(chunk) > 0:
+        yield chunk
+        chunk = list(islice(rows,chunkSize))
+
+def mineChunk(args):
+    """ given (rows,k,min_sup,miner name), returns the local k-patterns """
+    (rows,k,min_sup,miner) = args
+    chunk = Dataset()
+    chunk.rows = rows
+    return PARTITION_MINERS[miner](chunk,k,min_sup).keys()
+
+@decodesLabels
+def partitionPatterns(ds,k,min_sup,chunkSize,miner='fpgrowth',workers=1):
+    """ SON: mine chunks of ds locally, then verify the union globally """
+    log.info('called')
+    if chunkSize < 1:
+        raise ValueError('a chunk must hold at least one row')
+    n = len(ds)
+
+    def chunkTask(rows):
+        # rounding the local threshold up can not lose a global pattern:
+        # one falling short everywhere would total less than min_sup
+        return (rows,k,-(-min_sup * len(rows) // max(n,1)),miner)
+
+    candidates = set()
+    tasks = (chunkTask(rows) for rows in datasetChunks(ds,chunkSize))
+    if workers > 1:
+        pool = Pool(workers)
+        try:
+            # hand out one chunk per worker at a time to bound memory
+            batch = list(islice(tasks,workers))
+            while len(batch) > 0:
+                for local in pool.map(mineChunk,batch):
+                    candidates.update(local)
+                batch = list(islice(tasks,workers))
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        for task in tasks:
+            candidates.update(mineChunk(task))
+
+    trie = CandidateTrie(candidates)
+    for (row,weight) in weightedRows(ds):
+        trie.countRow(row,weight)
+    patterns = supportFilter(trie.counts,min_sup)
     log.info('found {0} k={1} patterns'.format(len(patterns),k))
     return patterns
 
+######################################################################
+# Sampling (Toivonen)
+######################################################################
+# For a quick answer, mine a random sample of the rows instead, at a
+# threshold lowered enough that, with probability 1 - delta, a
+# pattern frequent in the whole dataset is also frequent in the
+# sample.  By Hoeffding's inequality lowering the relative support by
+#   sqrt(ln(1/delta) / (2 * sampleSize))
+# is enough for any one pattern.
+#
+# Every pattern frequent in the sample is then counted exactly over
+# the whole dataset, together with the negative border: the patterns
+# not frequent in the sample all of whose subsets are.  A single pass
+# over the rows builds a bitset tidset per item, and each pattern is
+# counted by ANDing the tidsets of its items.  Those tidsets hold the
+# whole dataset in memory, so a StreamingDataset is instead counted
+# with a CandidateTrie per pattern length during one sequential scan,
+# which is slower but keeps it out of core.
+#
+# The sample's false positives are dropped and every support returned
+# is exact.  Any pattern the sample missed has a subset in the
+# negative border, so if no border pattern turns out frequent the
+# result is complete.  Otherwise some patterns may be missing and
+# another round is needed, with a new sample, a larger one, or a
+# smaller delta.
+######################################################################
+
+def sampleRows(ds,sampleSize,rng):
+    """ returns a list of sampleSize rows of ds drawn without replacement """
+    rows = getattr(ds,'rows',None)
+    if not hasattr(ds,'__IS_PREPROCESSED__') and \
+            hasattr(rows,'__getitem__'):
+        indices = rng.sample(xrange(len(rows)),min(sampleSize,len(rows)))
+        return map(lambda x: list(rows[x]),sorted(indices))
+    # a reservoir of rows for datasets that can only be iterated
+    sample = []
+    for (i,row) in enumerate(ds):
+        if i < sampleSize:
+            sample.append(list(row))
+        else:
+            j = rng.randint(0,i)
+            if j < sampleSize:
+                sample[j] = list(row)
+    return sample
+
+def negativeBorder(patterns,k):
+    """ the patterns of 2..k items not in patterns whose subsets all are """
+    # single items have only the empty set below them, so every item
+    # not in patterns is in the border; they are counted separately
+    levels = dict()
+    for pattern in patterns:
+        levels.setdefault(len(pattern),[]).append(pattern)
+    border = []
+    for i in range(2,k+1):
+        if i - 1 not in levels:
+            break
+        border.extend(filter(lambda x: x not in patterns,
+                             aprioriGen(levels[i-1])))
+    return border
+
+def countVerticalCandidates(vds,cands):
+    """ counts every item and the longer cands over the tidsets of vds """
+    counts = dict(((item,),vds.support(tids))
+                  for (item,tids) in vds.tidsets.iteritems())
+    for cand in cands:
+        if len(cand) > 1:
+            counts[cand] = vds.itemsetSupport(cand)
+    return counts
+
+def countStreamCandidates(ds,cands):
+    """ counts every item and the longer cands in one pass over ds """
+    tries = dict()
+    for cand in cands:
+        if len(cand) > 1:
+            tries.setdefault(len(cand),CandidateTrie()).addCandidate(cand)
+    counts = dict()
+    for row in ds:
+        for item in set(row):
+            counts[item] = counts.get(item,0) + 1
+        for trie in tries.itervalues():
+            trie.countRow(row)
+    counts = dict(((item,),count) for (item,count) in counts.iteritems())
+    for trie in tries.itervalues():
+        counts.update(trie.counts)
+    return counts
+
+def samplePatterns(ds,k,min_sup,sampleSize,miner='fpgrowth',delta=0.05,
+                   seed=None,kmin=None):
+    """ Toivonen: returns (kmin..k-patterns, whether they are complete) """
+    log.info('called')
+    checkMinSup(ds,min_sup)
+    if sampleSize < 1:
+        raise ValueError('a sample must hold at least one row')
+    if not 0 < delta < 1:
+        raise ValueError('delta must be between 0 and 1, not {0}'.\
+                             format(delta))
+    if kmin == None:
+        kmin = k
+    n = len(ds)
+    if n == 0:
+        # nothing to sample, and nothing that could have been missed
+        return (dict(),True)
+    rng = Random(seed)
+
+    with phase('sampling.mine'):
+        sample = Dataset()
+        sample.rows = sampleRows(ds,sampleSize,rng)
+        m = len(sample.rows)
+        lowered = float(min_sup) / max(n,1) - sqrt(ln(1.0 / delta) / (2 * m))
+        sampled = PARTITION_MINERS[miner](sample,k,max(1,int(lowered * m)),
+                                          kmin=1)
+        border = negativeBorder(sampled,k)
+    if stats != None:
+        stats.count('sampling.candidates',len(sampled))
+        stats.count('sampling.border',len(border))
+
+    with phase('sampling.verify'):
+        if isinstance(ds,StreamingDataset):
+            counts = countStreamCandidates(ds,sampled.keys() + border)
+        elif hasattr(ds,'__IS_VERTICAL__'):
+            vds = ds
+            counts = countVerticalCandidates(ds,sampled.keys() + border)
+        else:
+            vds = VerticalDataset(bitsets=True)
+            vds.readFromDataset(ds)
+            counts = countVerticalCandidates(vds,sampled.keys() + border)
+
+    # every item was counted, so a frequent one the sample missed shows
+    # up here along with the frequent patterns of the border
+    patterns = dict((pattern,count) for (pattern,count) in counts.iteritems()
+                    if kmin <= len(pattern) <= k and count >= min_sup)
+    missed = filter(lambda x: counts[x] >= min_sup and x not in sampled,
+                    counts.keys())
+    if hasattr(ds,'__IS_PREPROCESSED__'):
+        patterns = decodePatterns(patterns,ds.labels)
+    log.info('found {0} k={1}..{2} patterns, {3} border patterns frequent'.\
+                 format(len(patterns),kmin,k,len(missed)))
+    return (patterns,len(missed) == 0)
+
 ######################################################################
 # Basic Tests
 ######################################################################
@@ -390,33 +1599,33 @@ if __name__ == '__main__':
 
     import sys
 
+    configureLogging()
+
     if len(sys.argv) < 3:
-        print "usage: {0} [file] [k] [results]".format(sys.argv[0])
+        print "usage: {0} [file] [k|kmin-k] [results]".format(sys.argv[0])
         sys.exit(-1)
 
     filename = sys.argv[1]
-    k = int(sys.argv[2])
+    if '-' in sys.argv[2]:
+        (kmin,k) = map(int,sys.argv[2].split('-'))
+    else:
+        kmin = k = int(sys.argv[2])
 
-    max_results = -1
+    max_results = None
     if len(sys.argv) > 3:
         max_results = int(sys.argv[3])
     
-    ds = NumericalDataset()
+    ds = BinaryDataset()
     with open(filename,'rU') as f:
         ds.readFromFile(f)
 
     log.info("Read {0} lines in {1}".format(len(ds),filename))
 
-    fp_miners = ({'apriori':aprioriPatterns,
-                  'fpgrowth':fpGrowthPatterns,
-                  'eclat':eclatPatterns})
+    fp_miners = ({'apriori':iterAprioriPatterns,
+                  'fpgrowth':iterFPGrowthPatterns,
+                  'eclat':iterEclatPatterns})
 
+    # patterns are written as they are found, in the order found
     for key in fp_miners.keys():
-        patterns = fp_miners[key](ds,k,len(ds)/2)
-        if max_results == -1:
-            max_results = len(patterns)
-        for i in range(min(len(patterns),max_results)):
-            print patterns[i]
-        max_results = -1
-        if len(sys.argv) > 3:
-            max_results = int(sys.argv[3])
+        patterns = fp_miners[key](ds,k,len(ds)/2,kmin=kmin)
+        FimiPatternWriter(sys.stdout).writeAll(islice(patterns,max_results))
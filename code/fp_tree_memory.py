@@ -0,0 +1,71 @@
+#!/usr/bin/env python2.6
+######################################################################
+# fp_tree_memory.py
+######################################################################
+# A script comparing the memory used by FPTree and ArrayFPTree when
+# built over the same dataset.
+######################################################################
+# For license information, see LICENSE file
+# For copyright information, see COPYRIGHT file
+######################################################################
+
+import sys
+from sys import getsizeof
+from time import time
+from dataset import NumericalDataset
+from fp_mining import buildFPTree, FPTree, ArrayFPTree
+
+if len(sys.argv) < 2:
+    print "Usage: {0} [file_input]... [support_percent]".format(sys.argv[0])
+    sys.exit(-1)
+
+def fpTreeBytes(fptree):
+    """ approximate bytes held by the nodes and header lists of fptree """
+    total = getsizeof(fptree.itemNodes) + getsizeof(fptree.itemCounts)
+    nodes = [fptree.root]
+    for itemNodes in fptree.itemNodes.values():
+        total += getsizeof(itemNodes)
+        nodes.extend(itemNodes)
+    for node in nodes:
+        total += getsizeof(node) + getsizeof(node.__dict__)
+        total += getsizeof(node.children) + getsizeof(node.count)
+    return total
+
+def arrayFPTreeBytes(fptree):
+    """ approximate bytes held by the arrays and child index of fptree """
+    total = getsizeof(fptree.itemIds) + getsizeof(fptree.itemCounts)
+    for arr in (fptree.items,fptree.headers,fptree.item,fptree.count,
+                fptree.parent,fptree.link,fptree.hasChild):
+        total += getsizeof(arr)
+    total += getsizeof(fptree.children)
+    for (key,node) in fptree.children.iteritems():
+        total += getsizeof(key) + getsizeof(node)
+    return total
+
+files = sys.argv[1:]
+support = 0.0
+if len(files) > 1:
+    try:
+        support = float(files[-1])
+        files = files[:-1]
+    except ValueError:
+        pass
+
+print "{0:>20} {1:>12} {2:>8} {3:>12} {4:>8}".\
+    format('file/tree','nodes','secs','bytes','B/node')
+for filename in files:
+    ds = NumericalDataset()
+    with open(filename,'rU') as f:
+        ds.readFromFile(f)
+    min_sup = int(support * len(ds))
+    print filename
+
+    for (cls,measure) in ((FPTree,fpTreeBytes),
+                          (ArrayFPTree,arrayFPTreeBytes)):
+        start = time()
+        fptree = buildFPTree(ds,min_sup,cls)
+        secs = time() - start
+        nodes = fptree.nodeCount()
+        size = measure(fptree)
+        print "{0:>20} {1:>12} {2:>8.2f} {3:>12} {4:>8.1f}".\
+            format(cls.__name__,nodes,secs,size,float(size)/max(nodes,1))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python2.6
+######################################################################
+# instrumentation.py
+######################################################################
+# In which we define the counters and phase timers the miners fill in
+# while they run, and the logging setup of the command line scripts.
+######################################################################
+# For license information, see LICENSE file
+# For copyright information, see COPYRIGHT file
+######################################################################
+
+import logging
+import logging.config
+import os
+import time
+
+######################################################################
+# Stats
+######################################################################
+# A Stats object gathers named counts, such as candidates generated
+# or tree nodes built, the wall time of named phases, and the deepest
+# recursion reached.  The miners only touch one while it is switched
+# on (see fp_mining.collectStats), so when it is off the only cost is
+# a test of a global against None.
+######################################################################
+
+class Phase(object):
+    """ adds the wall time of a with block to a phase of stats """
+    def __init__(self,stats,name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self,*exc):
+        phases = self.stats.phases
+        phases[self.name] = phases.get(self.name,0.0) + \
+            time.time() - self.start
+        return False
+
+class NoPhase(object):
+    """ a with block that times nothing """
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        return False
+
+class Stats(object):
+    def __init__(self):
+        self.counts = dict()
+        self.phases = dict()
+        self.depth = 0
+        self.maxDepth = 0
+
+    def count(self,name,n=1):
+        self.counts[name] = self.counts.get(name,0) + n
+
+    def phase(self,name):
+        return Phase(self,name)
+
+    def enter(self):
+        """ notes one level deeper into a recursion """
+        self.depth += 1
+        self.maxDepth = max(self.maxDepth,self.depth)
+
+    def leave(self):
+        self.depth -= 1
+
+    def asDict(self):
+        return {'counts':dict(self.counts),
+                'phases':dict(self.phases),
+                'maxDepth':self.maxDepth}
+
+######################################################################
+# Logging Setup
+######################################################################
+# Importing a module never configures logging; the scripts call
+# configureLogging from their main blocks instead.  Its default file
+# is found relative to this module, not the current directory.
+######################################################################
+
+LOGGING_CONF = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '..','config','logging.conf')
+
+def configureLogging(path=LOGGING_CONF):
+    logging.config.fileConfig(path,disable_existing_loggers=False)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python2.6
+######################################################################
+# pattern_io.py
+######################################################################
+# In which we write mined patterns out as they are found, and read
+# them back in.
+######################################################################
+# For license information, see LICENSE file
+# For copyright information, see COPYRIGHT file
+######################################################################
+
+import struct
+
+######################################################################
+# Pattern Writers
+######################################################################
+# The iter* miners yield (pattern,support) pairs as they are found, so
+# a writer only ever holds one pattern at a time and flushes every
+# flushEvery patterns.  Neither the size of the output nor the time to
+# the last pattern limits when the first patterns reach the file.
+#
+# The text format is the one of the FIMI repository: the items of a
+# pattern separated by spaces, then its support in parentheses.
+#
+# The binary format is a magic string followed by one record per
+# pattern: its length and support, then its items as int32, so it
+# only holds numerical patterns.
+######################################################################
+
+PATTERN_MAGIC = 'FPMP'
+PATTERN_RECORD = struct.Struct('<IQ')
+
+class PatternWriter(object):
+    """ writes (pattern,support) pairs to the file f """
+    def __init__(self,f,flushEvery=1000):
+        self.f = f
+        self.flushEvery = flushEvery
+        self.count = 0
+
+    def encode(self,pattern,support):
+        raise NotImplementedError
+
+    def write(self,pattern,support):
+        self.f.write(self.encode(pattern,support))
+        self.count += 1
+        if self.count % self.flushEvery == 0:
+            self.f.flush()
+
+    def writeAll(self,patterns):
+        """ writes every pair from the iterable patterns, returns the count """
+        for (pattern,support) in patterns:
+            self.write(pattern,support)
+        self.f.flush()
+        return self.count
+
+class FimiPatternWriter(PatternWriter):
+    def encode(self,pattern,support):
+        return '{0} ({1})\n'.format(' '.join(map(str,pattern)),support)
+
+class BinaryPatternWriter(PatternWriter):
+    def __init__(self,f,flushEvery=1000):
+        PatternWriter.__init__(self,f,flushEvery)
+        f.write(PATTERN_MAGIC)
+
+    def encode(self,pattern,support):
+        return PATTERN_RECORD.pack(len(pattern),support) + \
+            struct.pack('<{0}i'.format(len(pattern)),*pattern)
+
+######################################################################
+# Pattern Readers
+######################################################################
+
+def readFimiPatterns(f):
+    """ yields the (pattern,support) pairs of a FIMI text file """
+    for line in f:
+        (items,support) = line.rstrip().rsplit(' (',1)
+        yield (tuple(items.split()),int(support[:-1]))
+
+def readBinaryPatterns(f):
+    """ yields the (pattern,support) pairs of a binary pattern file """
+    if f.read(len(PATTERN_MAGIC)) != PATTERN_MAGIC:
+        raise ValueError('not a binary pattern file')
+    while True:
+        record = f.read(PATTERN_RECORD.size)
+        if len(record) < PATTERN_RECORD.size:
+            return
+        (length,support) = PATTERN_RECORD.unpack(record)
+        items = struct.unpack('<{0}i'.format(length),f.read(4 * length))
+        yield (items,support)
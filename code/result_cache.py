@@ -0,0 +1,145 @@
+#!/usr/bin/env python2.6
+######################################################################
+# result_cache.py
+######################################################################
+# In which we cache mining results so that a query can be answered by
+# filtering an earlier run at a lower minimum support.
+######################################################################
+# For license information, see LICENSE file
+# For copyright information, see COPYRIGHT file
+######################################################################
+
+import hashlib
+import os
+import cPickle as pickle
+from dataset import weightedRows
+from fp_mining import fpGrowthPatterns, supportFilter
+
+######################################################################
+# Result Cache
+######################################################################
+# Every pattern with support at least s is also in the result of a run
+# at s' <= s, with the same support.  So a query for the k-patterns of
+# a dataset at s can be answered from any cached run at s' <= s by
+# dropping the patterns below s; the closest such s' is used since its
+# result is the smallest.  Only when no cached run covers the query is
+# the miner called.
+#
+# Results are keyed on a fingerprint of the dataset's rows and their
+# item types, together with the labels and weights of a preprocessed
+# dataset, so equal data shares entries whatever object holds it, and
+# on the name of the miner, so one miner is never served another's
+# result.  On disk the key is the file name, with min_sup written by
+# repr so that it reads back exactly.  The most recently used
+# maxEntries results are kept in memory.  With a directory, every
+# result is also pickled there, and a memory miss checks the disk
+# before mining.
+######################################################################
+
+def fingerprint(ds):
+    """ a hash of the rows of ds, in order """
+    sha = hashlib.sha1()
+    if hasattr(ds,'__IS_PREPROCESSED__'):
+        # its rows are item ids, which only mean something with the
+        # labels, and each stands for as many transactions as its weight
+        sha.update('preprocessed {0!r}\n'.format(ds.labels))
+        for (row,weight) in weightedRows(ds):
+            sha.update('{0!r} x{1}\n'.format(tuple(row),weight))
+        return sha.hexdigest()
+    # repr keeps the item types apart, so the rows of a Dataset and a
+    # NumericalDataset of the same file differ
+    for row in ds:
+        sha.update(repr(tuple(row)))
+        sha.update('\n')
+    return sha.hexdigest()
+
+def parseSupport(s):
+    """ the min_sup written as repr(min_sup), or None if s is not one """
+    for parse in (int,float):
+        try:
+            return parse(s)
+        except ValueError:
+            pass
+    return None
+
+class ResultCache(object):
+    def __init__(self,maxEntries=16,directory=None):
+        self.maxEntries = maxEntries
+        self.directory = directory
+        self.entries = dict()
+        self.lru = []
+        self.hits = 0
+        self.misses = 0
+
+    def _touch(self,key):
+        if key in self.lru:
+            self.lru.remove(key)
+        self.lru.append(key)
+        while len(self.lru) > self.maxEntries:
+            del self.entries[self.lru.pop(0)]
+
+    def _path(self,key):
+        (fp,miner,k,min_sup) = key
+        return os.path.join(self.directory,'{0}-{1}-{2}-{3!r}.pickle'.\
+                                format(fp,miner,k,min_sup))
+
+    def _diskKeys(self,fp,miner,k):
+        if self.directory == None or not os.path.isdir(self.directory):
+            return []
+        keys = []
+        for name in os.listdir(self.directory):
+            # a negative or exponent min_sup may hold a '-' of its own
+            parts = name[:-len('.pickle')].split('-',3)
+            if not name.endswith('.pickle') or len(parts) != 4 or \
+                    parts[:3] != [fp,miner,str(k)]:
+                continue
+            min_sup = parseSupport(parts[3])
+            if min_sup != None:
+                keys.append((fp,miner,k,min_sup))
+        return keys
+
+    def _covering(self,keys,fp,miner,k,min_sup):
+        """ the key of the closest run at or below min_sup, or None """
+        keys = filter(lambda x: x[:3] == (fp,miner,k) and x[3] <= min_sup,
+                      keys)
+        if len(keys) == 0:
+            return None
+        return max(keys,key=lambda x: x[3])
+
+    def _store(self,key,patterns):
+        self.entries[key] = patterns
+        self._touch(key)
+        if self.directory != None:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            path = self._path(key)
+            with open(path + '.tmp','wb') as f:
+                pickle.dump(patterns,f,pickle.HIGHEST_PROTOCOL)
+            os.rename(path + '.tmp',path)
+
+    def _load(self,key):
+        with open(self._path(key),'rb') as f:
+            patterns = pickle.load(f)
+        self.entries[key] = patterns
+        self._touch(key)
+        return patterns
+
+    def patterns(self,ds,k,min_sup=0,miner=fpGrowthPatterns,fp=None):
+        """ the k-patterns of ds with min_sup, mined only if not cached """
+        if fp == None:
+            fp = fingerprint(ds)
+        name = miner.__name__
+        key = self._covering(self.entries.keys(),fp,name,k,min_sup)
+        if key != None:
+            self.hits += 1
+            self._touch(key)
+            return supportFilter(self.entries[key],min_sup)
+        key = self._covering(self._diskKeys(fp,name,k),fp,name,k,min_sup)
+        if key != None:
+            self.hits += 1
+            return supportFilter(self._load(key),min_sup)
+
+        self.misses += 1
+        patterns = miner(ds,k,min_sup)
+        self._store((fp,name,k,min_sup),patterns)
+        return dict(patterns)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python2.6
+######################################################################
+# rules.py
+######################################################################
+# In which we generate association rules from frequent patterns.
+######################################################################
+# For license information, see LICENSE file
+# For copyright information, see COPYRIGHT file
+######################################################################
+
+from collections import namedtuple
+from fp_mining import aprioriGen, aprioriPatterns
+
+######################################################################
+# Association Rules
+######################################################################
+# A rule A -> C built from a frequent pattern P = A + C has
+#   confidence = support(P) / support(A)
+#   lift       = confidence / (support(C) / n)
+# for n transactions.  Every subset of a frequent pattern is frequent,
+# so all of these supports are already known once mining is done:
+# they are looked up in a support index, a dict(pattern -> support)
+# of every frequent pattern, rather than counted again in the data.
+#
+# The consequents of P are grown level-wise like Apriori candidates.
+# Moving an item from the antecedent to the consequent can only lower
+# the confidence, so only consequents whose rule met min_conf are
+# joined into longer ones.  Rules are yielded as they are found.
+######################################################################
+
+Rule = namedtuple('Rule','antecedent consequent support confidence lift')
+
+def supportIndex(ds,k,min_sup=0):
+    """ returns (k-patterns, dict of all frequent patterns up to k) """
+    supports = dict()
+    patterns = aprioriPatterns(ds,k,min_sup,supports=supports)
+    return (patterns,supports)
+
+def patternRules(pattern,supports,n,min_conf):
+    """ yields the rules from the sorted pattern tuple with min_conf """
+    support = supports[pattern]
+    consequents = map(lambda x: (x,),pattern)
+    while len(consequents) > 0 and len(consequents[0]) < len(pattern):
+        confident = []
+        for consequent in consequents:
+            antecedent = tuple(filter(lambda x: x not in consequent,pattern))
+            confidence = float(support) / supports[antecedent]
+            if confidence >= min_conf:
+                confident.append(consequent)
+                lift = confidence * n / supports[consequent]
+                yield Rule(antecedent,consequent,support,confidence,lift)
+        consequents = aprioriGen(confident)
+
+def associationRules(patterns,supports,n,min_conf=0.0):
+    """ yields the rules from every pattern in patterns with min_conf """
+    for pattern in patterns:
+        if len(pattern) > 1:
+            for rule in patternRules(pattern,supports,n,min_conf):
+                yield rule
+
+######################################################################
+# Basic Tests
+######################################################################
+
+if __name__ == '__main__':
+
+    import sys
+    from dataset import BinaryDataset
+    from instrumentation import configureLogging
+
+    configureLogging()
+
+    if len(sys.argv) < 4:
+        print "usage: {0} [file] [k] [min_conf]".format(sys.argv[0])
+        sys.exit(-1)
+
+    filename = sys.argv[1]
+    k = int(sys.argv[2])
+    min_conf = float(sys.argv[3])
+
+    ds = BinaryDataset()
+    with open(filename,'rU') as f:
+        ds.readFromFile(f)
+
+    (patterns,supports) = supportIndex(ds,k,len(ds)/2)
+    for rule in associationRules(patterns,supports,len(ds),min_conf):
+        print "{0} -> {1} (support {2}, confidence {3:.3f}, lift {4:.3f})".\
+            format(list(rule.antecedent),list(rule.consequent),
+                   rule.support,rule.confidence,rule.lift)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python2.6
+######################################################################
+# stream_mining.py
+######################################################################
+# In which we mine frequent patterns over a sliding window of the most
+# recent transactions of a stream.
+######################################################################
+# For license information, see LICENSE file
+# For copyright information, see COPYRIGHT file
+######################################################################
+
+from collections import deque
+from fp_mining import CanTree, mineFPTree
+
+######################################################################
+# Sliding Window
+######################################################################
+# The window holds the last windowSize transactions both as a queue
+# and inside a CanTree.  Each arriving transaction is inserted into
+# the tree and, once the window is full, the oldest is removed from
+# it again, so an update costs a walk down two paths and the tree
+# never holds more than the window.  Because the tree is always
+# exact, the frequent patterns of the window can be mined from it at
+# any moment.
+######################################################################
+
+class SlidingWindowMiner(object):
+    def __init__(self,windowSize):
+        if windowSize < 1:
+            raise ValueError('the window must hold at least one row')
+        self.windowSize = windowSize
+        self.window = deque()
+        self.fptree = CanTree()
+
+    def __len__(self):
+        return len(self.window)
+
+    def add(self,row):
+        """ adds one transaction, expiring the oldest if the window is full """
+        self.addBatch([row])
+
+    def addBatch(self,rows):
+        """ adds transactions in arrival order, expiring the oldest ones """
+        rows = map(set,rows)[-self.windowSize:]
+        overflow = len(self.window) + len(rows) - self.windowSize
+        for _ in range(max(overflow,0)):
+            self.fptree.removeItemset(self.window.popleft())
+        self.fptree.addTransactions(rows)
+        for row in rows:
+            self.window.append(self.fptree.sortItemset(row))
+
+    def patterns(self,k,min_sup):
+        """ returns a dict(pattern tuple -> support) over the window """
+        return mineFPTree(self.fptree,k,min_sup)
+
+######################################################################
+# Basic Tests
+######################################################################
+
+if __name__ == '__main__':
+
+    import sys
+    from dataset import StreamingDataset
+    from instrumentation import configureLogging
+
+    configureLogging()
+
+    if len(sys.argv) < 4:
+        print "usage: {0} [file] [window] [k]".format(sys.argv[0])
+        sys.exit(-1)
+
+    filename = sys.argv[1]
+    windowSize = int(sys.argv[2])
+    k = int(sys.argv[3])
+
+    ds = StreamingDataset(numerical=True)
+    with open(filename,'rU') as f:
+        ds.readFromFile(f)
+
+    miner = SlidingWindowMiner(windowSize)
+    for row in ds:
+        miner.add(row)
+    patterns = miner.patterns(k,len(miner)/2)
+    for pattern in sorted(patterns.keys()):
+        print "{0} ({1})".format(list(pattern),patterns[pattern])
@@ -9,13 +9,597 @@
 ######################################################################
 
 import itertools
+import os
+import shutil
+import tempfile
 import unittest
 import fp_mining
 import dataset
+import stream_mining
+import rules
+import result_cache
+import pattern_io
+import benchmark
 
 class TestFrequentPatternFunctions(unittest.TestCase):
     """ Unit tests for fp_mining """
 
+    def setUp(self):
+        self.ds = dataset.NumericalDataset()
+        with open('../data/chess_tiny.dat','rU') as f:
+            self.ds.readFromFile(f)
+
+    def bruteForcePatterns(self,ds,k,min_sup):
+        rows = [set(row) for row in ds]
+        items = sorted(set(itertools.chain(*rows)))
+        patterns = dict()
+        for comb in itertools.combinations(items,k):
+            support = sum(1 for row in rows if row.issuperset(comb))
+            if support >= min_sup:
+                patterns[comb] = support
+        return patterns
+
+    def test_apriori_gen_join_and_prune(self):
+        prev = [(1,2),(1,3),(1,4),(2,3),(2,4)]
+        # (1,3,4) and (2,3,4) drop out because (3,4) is infrequent
+        self.assertEqual(fp_mining.aprioriGen(prev),[(1,2,3),(1,2,4)])
+        self.assertEqual(fp_mining.aprioriGen([(1,),(2,),(3,)]),
+                         [(1,2),(1,3),(2,3)])
+
+    def test_candidate_trie_counts(self):
+        trie = fp_mining.CandidateTrie([(1,2),(1,3),(2,3),(3,4)])
+        for row in [[1,2,3],[3,1],[4,3,2],[5]]:
+            trie.countRow(row)
+        self.assertEqual(trie.counts,{(1,2):1,(1,3):2,(2,3):2,(3,4):1})
+
+    def test_apriori_patterns(self):
+        for k in range(1,4):
+            expected = self.bruteForcePatterns(self.ds,k,7)
+            self.assertEqual(fp_mining.aprioriPatterns(self.ds,k,7),expected)
+
+    def test_parallel_apriori(self):
+        labelled = dataset.Dataset()
+        with open('../data/chess_tiny.dat','rU') as f:
+            labelled.readFromFile(f)
+        for ds in (self.ds,labelled):
+            for k in range(1,4):
+                expected = fp_mining.aprioriPatterns(ds,k,7)
+                patterns = fp_mining.aprioriPatterns(ds,k,7,workers=3)
+                self.assertEqual(patterns,expected)
+
+    def test_array_fptree_matches_fptree(self):
+        for k in range(1,4):
+            expected = fp_mining.fpGrowthPatterns(self.ds,k,7)
+            patterns = fp_mining.fpGrowthPatterns(self.ds,k,7,
+                                                  fp_mining.ArrayFPTree)
+            self.assertEqual(patterns,expected)
+        tree = fp_mining.buildFPTree(self.ds,7)
+        arrayTree = fp_mining.buildFPTree(self.ds,7,fp_mining.ArrayFPTree)
+        self.assertEqual(arrayTree.nodeCount(),tree.nodeCount())
+        self.assertEqual(arrayTree.itemCounts,tree.itemCounts)
+        self.assertEqual(len(arrayTree),len(tree))
+        for item in tree.itemCounts:
+            self.assertEqual(len(list(arrayTree.iterItemNodes(item))),
+                             len(tree.itemNodes[item]))
+            self.assertEqual(sum(map(lambda x: arrayTree.count[x],
+                                     arrayTree.iterItemNodes(item))),
+                             sum(map(lambda x: x.count,
+                                     tree.iterItemNodes(item))))
+
+    def test_weighted_conditional_pattern_base(self):
+        rows = [[1,2,3]] * 5 + [[1,3]] * 2 + [[2,3]]
+        for cls in (fp_mining.FPTree,fp_mining.ArrayFPTree):
+            tree = fp_mining.buildFPTree(rows,1,cls)
+            # rows are inserted in the order 3, 1, 2
+            base = tree.getConditionalPatternBase(2)
+            self.assertEqual(sorted(base),[([3],1),([3,1],5)])
+            self.assertEqual(tree.conditionalItemCounts(2),{1:5,3:6})
+            cfpt = fp_mining.buildConditionalFPTree(tree,2,3)
+            self.assertEqual(cfpt.itemCounts,{1:5,3:6})
+            self.assertEqual(len(cfpt),6)
+
+    def test_miners_return_supports(self):
+        for k in range(1,4):
+            expected = self.bruteForcePatterns(self.ds,k,7)
+            self.assertEqual(fp_mining.fpGrowthPatterns(self.ds,k,7),expected)
+            self.assertEqual(fp_mining.eclatPatterns(self.ds,k,7),expected)
+
+    def test_parallel_fpgrowth(self):
+        for k in range(1,5):
+            expected = fp_mining.fpGrowthPatterns(self.ds,k,6)
+            patterns = fp_mining.fpGrowthPatterns(self.ds,k,6,workers=2)
+            self.assertEqual(patterns,expected)
+
+    def test_partition_patterns(self):
+        for k in range(1,4):
+            expected = self.bruteForcePatterns(self.ds,k,6)
+            for miner in fp_mining.PARTITION_MINERS.keys():
+                patterns = fp_mining.partitionPatterns(self.ds,k,6,4,miner)
+                self.assertEqual(patterns,expected)
+            patterns = fp_mining.partitionPatterns(self.ds,k,6,2,workers=2)
+            self.assertEqual(patterns,expected)
+        for chunkSize in (0,-1):
+            self.assertRaises(ValueError,fp_mining.partitionPatterns,
+                              self.ds,2,6,chunkSize)
+
+    def test_cantree_incremental(self):
+        ds = dataset.NumericalDataset()
+        with open('../data/mushroom.dat','rU') as f:
+            ds.readFromFile(f)
+        tree = fp_mining.CanTree()
+        for start in range(0,len(ds),2000):
+            rows = ds.rows[start:start+2000]
+            tree.addTransactions(rows)
+            seen = dataset.NumericalDataset()
+            seen.rows = ds.rows[:start+2000]
+            min_sup = len(seen) / 3
+            for k in (1,2,3):
+                self.assertEqual(fp_mining.mineFPTree(tree,k,min_sup),
+                                 fp_mining.fpGrowthPatterns(seen,k,min_sup))
+        nodes = tree.nodeCount()
+        tree.restructure()
+        self.assertTrue(tree.nodeCount() <= nodes)
+        self.assertEqual(len(tree),len(ds))
+        self.assertEqual(fp_mining.mineFPTree(tree,3,2000),
+                         fp_mining.fpGrowthPatterns(ds,3,2000))
+
+    def test_eclat_diffsets(self):
+        for k in range(1,5):
+            expected = self.bruteForcePatterns(self.ds,k,6)
+            self.assertEqual(fp_mining.eclatPatterns(self.ds,k,6,True),
+                             expected)
+
+    def test_eclat_bitsets(self):
+        vds = dataset.VerticalDataset(bitsets=True)
+        vds.readFromDataset(self.ds)
+        for k in range(1,4):
+            expected = self.bruteForcePatterns(self.ds,k,6)
+            self.assertEqual(fp_mining.eclatPatterns(vds,k,6),expected)
+            self.assertEqual(fp_mining.eclatPatterns(vds,k,6,True),expected)
+
+    def test_streaming_dataset(self):
+        sds = dataset.StreamingDataset(numerical=True)
+        with open('../data/chess_tiny.dat','rU') as f:
+            sds.readFromFile(f)
+        self.assertEqual(list(sds),self.ds.rows)
+        self.assertEqual(len(sds),len(self.ds))
+        for k in range(1,4):
+            expected = self.bruteForcePatterns(self.ds,k,7)
+            self.assertEqual(fp_mining.aprioriPatterns(sds,k,7),expected)
+            self.assertEqual(fp_mining.fpGrowthPatterns(sds,k,7),expected)
+        self.assertRaises(TypeError,sds.readFromDataset,self.ds)
+
+    def test_top_k_patterns(self):
+        for k in (2,3):
+            patterns = fp_mining.topKPatterns(self.ds,50,k)
+            self.assertEqual(len(patterns),50)
+            threshold = min(patterns.values())
+            expected = self.bruteForcePatterns(self.ds,k,threshold + 1)
+            for (pattern,support) in expected.iteritems():
+                self.assertEqual(patterns[pattern],support)
+        # 29 items appear in every row, so any 5 patterns of them will do
+        patterns = fp_mining.topKPatterns(self.ds,5)
+        self.assertEqual(patterns.values(),[9] * 5)
+        self.assertEqual(fp_mining.topKPatterns(self.ds,0),{})
+        self.assertRaises(ValueError,fp_mining.topKPatterns,self.ds,-1)
+
+    def allFrequentPatterns(self,ds,min_sup):
+        patterns = dict()
+        k = 1
+        found = fp_mining.fpGrowthPatterns(ds,k,min_sup)
+        while len(found) > 0:
+            patterns.update(found)
+            k += 1
+            found = fp_mining.fpGrowthPatterns(ds,k,min_sup)
+        return patterns
+
+    def test_closed_and_maximal_patterns(self):
+        ds = dataset.NumericalDataset()
+        with open('../data/mushroom.dat','rU') as f:
+            ds.readFromFile(f)
+        patterns = self.allFrequentPatterns(ds,3000)
+        closed = dict()
+        maximal = dict()
+        for (pattern,support) in patterns.iteritems():
+            supersets = [patterns[p] for p in patterns
+                         if len(p) == len(pattern) + 1
+                         and set(p).issuperset(pattern)]
+            if support not in supersets:
+                closed[pattern] = support
+            if len(supersets) == 0:
+                maximal[pattern] = support
+
+        self.assertEqual(fp_mining.closedPatterns(ds,3000),closed)
+        vds = dataset.VerticalDataset(bitsets=True)
+        vds.readFromDataset(ds)
+        self.assertEqual(fp_mining.closedPatterns(vds,3000),closed)
+        self.assertEqual(fp_mining.maximalPatterns(ds,3000),maximal)
+        self.assertTrue(len(maximal) < len(closed) < len(patterns))
+
+    def test_pattern_length_range(self):
+        expected = dict()
+        for k in range(2,4):
+            expected.update(fp_mining.fpGrowthPatterns(self.ds,k,7))
+        self.assertEqual(fp_mining.aprioriPatterns(self.ds,3,7,kmin=2),
+                         expected)
+        self.assertEqual(fp_mining.aprioriPatterns(self.ds,3,7,workers=2,
+                                                   kmin=2),expected)
+        self.assertEqual(fp_mining.fpGrowthPatterns(self.ds,3,7,kmin=2),
+                         expected)
+        self.assertEqual(fp_mining.fpGrowthPatterns(self.ds,3,7,workers=2,
+                                                    kmin=2),expected)
+        self.assertEqual(fp_mining.eclatPatterns(self.ds,3,7,kmin=2),
+                         expected)
+        self.assertEqual(fp_mining.eclatPatterns(self.ds,3,7,diffsets=True,
+                                                 kmin=2),expected)
+        expected.update(fp_mining.fpGrowthPatterns(self.ds,1,7))
+        self.assertEqual(fp_mining.fpGrowthPatterns(self.ds,3,7,kmin=1),
+                         expected)
+
+    def test_pattern_iterators(self):
+        expected = fp_mining.fpGrowthPatterns(self.ds,3,7,kmin=1)
+        for patterns in (fp_mining.iterAprioriPatterns(self.ds,3,7,kmin=1),
+                         fp_mining.iterFPGrowthPatterns(self.ds,3,7,kmin=1),
+                         fp_mining.iterEclatPatterns(self.ds,3,7,kmin=1)):
+            found = list(patterns)
+            self.assertEqual(len(found),len(expected))
+            self.assertEqual(dict(found),expected)
+        # abandoning a parallel iterator early shuts its workers down
+        patterns = fp_mining.iterFPGrowthPatterns(self.ds,3,7,workers=2)
+        for (pattern,support) in itertools.islice(patterns,5):
+            self.assertEqual(expected[pattern],support)
+        patterns.close()
+
+    def test_collect_stats(self):
+        stats = fp_mining.collectStats()
+        try:
+            fp_mining.aprioriPatterns(self.ds,3,7)
+            self.assertTrue(stats.counts['apriori.candidates'] > 0)
+            self.assertTrue(stats.counts['apriori.pruned'] > 0)
+            self.assertTrue(stats.phases['apriori.count'] > 0)
+
+            stats = fp_mining.collectStats()
+            fp_mining.fpGrowthPatterns(self.ds,3,7)
+            self.assertEqual(stats.maxDepth,2)
+            fptree = fp_mining.buildFPTree(self.ds,7)
+            self.assertTrue(stats.counts['fpgrowth.nodes'] >
+                            fptree.nodeCount())
+            self.assertEqual(stats.depth,0)
+        finally:
+            fp_mining.collectStats(False)
+        before = stats.asDict()
+        fp_mining.fpGrowthPatterns(self.ds,3,7)
+        self.assertEqual(stats.asDict(),before)
+
+    def test_matrix_apriori(self):
+        # the numpy engine is optional
+        if fp_mining.numpy == None:
+            return
+        for (k,min_sup) in ((1,0),(2,8),(3,7),(4,9)):
+            self.assertEqual(fp_mining.aprioriPatterns(self.ds,k,min_sup,
+                                                       engine='numpy'),
+                             fp_mining.aprioriPatterns(self.ds,k,min_sup))
+        ds = dataset.Dataset()
+        with open('../data/tiny.dat','rU') as f:
+            ds.readFromFile(f)
+        supports = dict()
+        self.assertEqual(fp_mining.aprioriPatterns(ds,3,1,supports=supports,
+                                                   kmin=2,engine='numpy'),
+                         fp_mining.aprioriPatterns(ds,3,1,kmin=2))
+        self.assertEqual(supports,fp_mining.aprioriPatterns(ds,3,1,kmin=1))
+        self.assertRaises(ValueError,fp_mining.aprioriPatterns,ds,2,1,
+                          engine='numpy',workers=2)
+
+    def test_preprocessed_mining(self):
+        ds = dataset.Dataset()
+        with open('../data/chess_small.dat','rU') as f:
+            ds.readFromFile(f)
+        pds = ds.preprocess(80)
+        self.assertTrue(len(pds.rows) < len(ds))
+        vds = dataset.VerticalDataset(bitsets=True)
+        vds.readFromDataset(pds)
+        for (k,min_sup) in ((1,80),(3,85)):
+            expected = fp_mining.fpGrowthPatterns(ds,k,min_sup,kmin=1)
+            self.assertEqual(fp_mining.aprioriPatterns(pds,k,min_sup,
+                                                       kmin=1),expected)
+            self.assertEqual(fp_mining.fpGrowthPatterns(pds,k,min_sup,
+                                                        kmin=1),expected)
+            self.assertEqual(dict(fp_mining.iterEclatPatterns(pds,k,min_sup,
+                                                              kmin=1)),
+                             expected)
+            self.assertEqual(fp_mining.eclatPatterns(vds,k,min_sup,
+                                                     diffsets=True,kmin=1),
+                             expected)
+        self.assertEqual(fp_mining.closedPatterns(vds,90),
+                         fp_mining.closedPatterns(ds,90))
+        self.assertEqual(fp_mining.maximalPatterns(pds,90),
+                         fp_mining.maximalPatterns(ds,90))
+        self.assertEqual(fp_mining.partitionPatterns(pds,2,90,30),
+                         fp_mining.fpGrowthPatterns(ds,2,90))
+        # below its min_sup the dropped items would be missed
+        self.assertRaises(ValueError,fp_mining.fpGrowthPatterns,pds,2,70)
+        self.assertRaises(ValueError,fp_mining.aprioriPatterns,pds,2,
+                          min_sup=70)
+        self.assertRaises(ValueError,fp_mining.eclatPatterns,pds,1)
+        self.assertRaises(ValueError,fp_mining.closedPatterns,vds,70)
+        self.assertRaises(ValueError,fp_mining.samplePatterns,pds,2,70,50)
+        self.assertRaises(ValueError,fp_mining.topKPatterns,pds,40,1)
+        # at or above it the top patterns are found as usual
+        top = fp_mining.topKPatterns(pds,10,2)
+        expected = fp_mining.topKPatterns(ds,10,2)
+        self.assertEqual(sorted(top.values()),sorted(expected.values()))
+        supports = fp_mining.fpGrowthPatterns(ds,2,min(top.values()))
+        for (pattern,support) in top.iteritems():
+            self.assertEqual(supports[pattern],support)
+
+    def test_sample_patterns(self):
+        ds = dataset.NumericalDataset()
+        with open('../data/chess_small.dat','rU') as f:
+            ds.readFromFile(f)
+        expected = fp_mining.fpGrowthPatterns(ds,3,80,kmin=1)
+        (patterns,complete) = fp_mining.samplePatterns(ds,3,80,50,seed=1,
+                                                       kmin=1)
+        self.assertTrue(complete)
+        self.assertEqual(patterns,expected)
+        # a tiny sample with a weak bound misses some, and says so
+        (patterns,complete) = fp_mining.samplePatterns(ds,3,80,10,delta=.9,
+                                                       seed=0,kmin=1)
+        self.assertFalse(complete)
+        self.assertTrue(0 < len(patterns) < len(expected))
+        for (pattern,support) in patterns.iteritems():
+            self.assertEqual(expected[pattern],support)
+        # a streaming dataset is verified in a sequential scan
+        sds = dataset.StreamingDataset(numerical=True)
+        with open('../data/chess_small.dat','rU') as f:
+            sds.readFromFile(f)
+        self.assertEqual(fp_mining.samplePatterns(sds,3,80,50,seed=1,kmin=1),
+                         (expected,True))
+        self.assertEqual(fp_mining.samplePatterns(dataset.Dataset(),2,1,5),
+                         ({},True))
+        self.assertRaises(ValueError,fp_mining.samplePatterns,ds,2,80,0)
+        for delta in (0,1,-.5,2):
+            self.assertRaises(ValueError,fp_mining.samplePatterns,ds,2,80,50,
+                              delta=delta)
+        (patterns,complete) = fp_mining.samplePatterns(ds.preprocess(80),3,
+                                                       80,50,'eclat',seed=1)
+        self.assertTrue(complete)
+        self.assertEqual(patterns,fp_mining.fpGrowthPatterns(ds,3,80))
+
+class TestStreamMiningFunctions(unittest.TestCase):
+
+    def test_sliding_window(self):
+        ds = dataset.NumericalDataset()
+        with open('../data/mushroom.dat','rU') as f:
+            ds.readFromFile(f)
+        miner = stream_mining.SlidingWindowMiner(1000)
+        for end in range(500,len(ds),1500):
+            miner.addBatch(ds.rows[end-500:end])
+            for row in ds.rows[end:end+1000]:
+                miner.add(row)
+            window = dataset.NumericalDataset()
+            window.rows = ds.rows[:end+1000][-1000:]
+            self.assertEqual(len(miner),len(window))
+            self.assertEqual(len(miner.fptree),len(window))
+            for k in (1,2,3):
+                self.assertEqual(miner.patterns(k,300),
+                                 fp_mining.fpGrowthPatterns(window,k,300))
+            items = set(itertools.chain(*window.rows))
+            self.assertEqual(set(miner.fptree.itemCounts.keys()),items)
+            self.assertEqual(set(miner.fptree.order.keys()),items)
+        self.assertRaises(ValueError,stream_mining.SlidingWindowMiner,0)
+
+class TestRuleFunctions(unittest.TestCase):
+
+    def test_association_rules(self):
+        ds = dataset.NumericalDataset()
+        with open('../data/chess_small.dat','rU') as f:
+            ds.readFromFile(f)
+        rows = [set(row) for row in ds]
+        def support(itemset):
+            return sum(1 for row in rows if row.issuperset(itemset))
+
+        (patterns,supports) = rules.supportIndex(ds,3,80)
+        self.assertEqual(patterns,fp_mining.aprioriPatterns(ds,3,80))
+        for k in (1,2):
+            for pattern in fp_mining.aprioriPatterns(ds,k,80):
+                self.assertTrue(pattern in supports)
+
+        expected = set()
+        for pattern in patterns:
+            for size in (1,2):
+                for consequent in itertools.combinations(pattern,size):
+                    antecedent = set(pattern) - set(consequent)
+                    confidence = float(support(pattern)) / support(antecedent)
+                    if confidence >= 0.95:
+                        expected.add((tuple(sorted(antecedent)),consequent))
+
+        found = rules.associationRules(patterns,supports,len(ds),0.95)
+        self.assertFalse(isinstance(found,list))
+        found = list(found)
+        self.assertEqual(set((r.antecedent,r.consequent) for r in found),
+                         expected)
+        for rule in found[:50]:
+            pattern = rule.antecedent + rule.consequent
+            self.assertEqual(rule.support,support(pattern))
+            self.assertAlmostEqual(rule.lift,rule.confidence * len(ds) /
+                                   support(rule.consequent))
+
+    def test_preprocessed_rules(self):
+        ds = dataset.NumericalDataset()
+        with open('../data/chess_small.dat','rU') as f:
+            ds.readFromFile(f)
+        pds = ds.preprocess(80)
+        (patterns,supports) = rules.supportIndex(ds,3,85)
+        (pPatterns,pSupports) = rules.supportIndex(pds,3,85)
+        self.assertEqual((pPatterns,pSupports),(patterns,supports))
+        self.assertEqual(set(rules.associationRules(pPatterns,pSupports,
+                                                    len(pds),0.95)),
+                         set(rules.associationRules(patterns,supports,
+                                                    len(ds),0.95)))
+        # every engine fills the index with the original labels
+        kwargs = [{'workers':2}]
+        if fp_mining.numpy != None:
+            kwargs.append({'engine':'numpy'})
+        for kw in kwargs:
+            found = dict()
+            fp_mining.aprioriPatterns(pds,3,85,supports=found,**kw)
+            self.assertEqual(found,supports)
+
+class TestResultCacheFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.ds = dataset.NumericalDataset()
+        with open('../data/chess_small.dat','rU') as f:
+            self.ds.readFromFile(f)
+        self.calls = []
+
+    def miner(self,ds,k,min_sup):
+        self.calls.append((k,min_sup))
+        return fp_mining.fpGrowthPatterns(ds,k,min_sup)
+
+    def test_filters_lower_support_runs(self):
+        cache = result_cache.ResultCache(maxEntries=2)
+        for min_sup in (80,90,95,80):
+            self.assertEqual(cache.patterns(self.ds,2,min_sup,self.miner),
+                             fp_mining.fpGrowthPatterns(self.ds,2,min_sup))
+        self.assertEqual(self.calls,[(2,80)])
+        cache.patterns(self.ds,2,70,self.miner)
+        cache.patterns(self.ds,3,90,self.miner)
+        cache.patterns(self.ds,2,85,self.miner)
+        self.assertEqual(self.calls,[(2,80),(2,70),(3,90)])
+        # (2,80) was evicted, (2,70) still answers
+        fp = result_cache.fingerprint(self.ds)
+        self.assertEqual(sorted(cache.entries.keys()),
+                         sorted([(fp,'miner',2,70),(fp,'miner',3,90)]))
+        # another miner is not served this one's results
+        cache.patterns(self.ds,2,85,fp_mining.eclatPatterns)
+        self.assertEqual(cache.misses,4)
+
+    def test_item_types_fingerprint(self):
+        strings = dataset.Dataset()
+        numbers = dataset.NumericalDataset()
+        for ds in (strings,numbers):
+            with open('../data/tiny.dat','rU') as f:
+                ds.readFromFile(f)
+        cache = result_cache.ResultCache()
+        for ds in (strings,numbers):
+            self.assertEqual(cache.patterns(ds,1,1),
+                             fp_mining.fpGrowthPatterns(ds,1,1))
+        self.assertEqual(cache.misses,2)
+
+    def test_preprocessed_fingerprint(self):
+        first = dataset.Dataset()
+        first.rows = [['a','b'],['a']]
+        second = dataset.Dataset()
+        second.rows = [['x','y'],['x']]
+        cache = result_cache.ResultCache()
+        self.assertEqual(cache.patterns(first.preprocess(),1,1),
+                         {('a',):2,('b',):1})
+        self.assertEqual(cache.patterns(second.preprocess(),1,1),
+                         {('x',):2,('y',):1})
+        # the same distinct rows with other weights are other data
+        third = dataset.Dataset()
+        third.rows = [['a','b'],['a'],['a']]
+        self.assertNotEqual(result_cache.fingerprint(first.preprocess()),
+                            result_cache.fingerprint(third.preprocess()))
+
+    def test_disk_tier(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache = result_cache.ResultCache(directory=tmpdir)
+            cache.patterns(self.ds,2,80,self.miner)
+            cache = result_cache.ResultCache(directory=tmpdir)
+            self.assertEqual(cache.patterns(self.ds,2,90,self.miner),
+                             fp_mining.fpGrowthPatterns(self.ds,2,90))
+            self.assertEqual(self.calls,[(2,80)])
+            self.assertEqual((cache.hits,cache.misses),(1,0))
+            # fractional supports read back exactly, stray files are skipped
+            open(os.path.join(tmpdir,'junk-miner-2-x.pickle'),'w').close()
+            cache.patterns(self.ds,2,75.5,self.miner)
+            cache = result_cache.ResultCache(directory=tmpdir)
+            self.assertEqual(cache.patterns(self.ds,2,78,self.miner),
+                             fp_mining.fpGrowthPatterns(self.ds,2,78))
+            self.assertEqual(self.calls,[(2,80),(2,75.5)])
+            self.assertEqual((cache.hits,cache.misses),(1,0))
+        finally:
+            shutil.rmtree(tmpdir)
+
+class TestPatternIOFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.ds = dataset.NumericalDataset()
+        with open('../data/chess_tiny.dat','rU') as f:
+            self.ds.readFromFile(f)
+        self.patterns = fp_mining.fpGrowthPatterns(self.ds,2,8)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_fimi_writer(self):
+        path = os.path.join(self.tmpdir,'patterns.txt')
+        with open(path,'w') as f:
+            writer = pattern_io.FimiPatternWriter(f,flushEvery=10)
+            patterns = fp_mining.iterFPGrowthPatterns(self.ds,2,8)
+            self.assertEqual(writer.writeAll(patterns),len(self.patterns))
+        with open(path) as f:
+            read = dict(pattern_io.readFimiPatterns(f))
+        self.assertEqual(read,dict((tuple(map(str,pattern)),support)
+                                   for (pattern,support)
+                                   in self.patterns.iteritems()))
+
+    def test_binary_writer(self):
+        path = os.path.join(self.tmpdir,'patterns.bin')
+        with open(path,'wb') as f:
+            writer = pattern_io.BinaryPatternWriter(f)
+            writer.writeAll(fp_mining.iterEclatPatterns(self.ds,2,8))
+        with open(path,'rb') as f:
+            self.assertEqual(dict(pattern_io.readBinaryPatterns(f)),
+                             self.patterns)
+        with open(path,'rb') as f:
+            f.seek(1)
+            self.assertRaises(ValueError,list,
+                              pattern_io.readBinaryPatterns(f))
+
+class TestBenchmarkFunctions(unittest.TestCase):
+
+    def test_run_case(self):
+        results = dict((miner,benchmark.runCase('../data/tiny.dat',miner,
+                                                3,1,.5))
+                       for miner in ('apriori','fpgrowth','eclat'))
+        for result in results.itervalues():
+            self.assertEqual(result['patterns'],5)
+            self.assertEqual(result['min_sup'],2)
+            self.assertTrue(result['maxrss_kb'] > 0)
+            self.assertTrue('load' in result['phases'])
+        self.assertEqual(sorted(results['fpgrowth']['phases'].keys()),
+                         ['fpgrowth.build','fpgrowth.mine','load'])
+        self.assertTrue(results['eclat']['counts']['eclat.tidsets'] > 0)
+
+        # the committed baseline holds these cases with the same counts
+        baseline = benchmark.readResults('../baselines/benchmark.json')
+        keys = set(map(benchmark.caseKey,baseline))
+        for (miner,result) in results.iteritems():
+            result.update({'dataset':'tiny.dat','miner':miner,'k':3,
+                           'kmin':1,'support':.5})
+            self.assertTrue(benchmark.caseKey(result) in keys)
+        self.assertEqual(benchmark.compareResults(results.values(),baseline,
+                                                  slack=60),[])
+
+    def test_compare_results(self):
+        baseline = [{'dataset':'chess.dat','miner':'eclat','k':3,'kmin':1,
+                     'support':.8,'wall':1.0,'patterns':729}]
+        result = dict(baseline[0])
+        self.assertEqual(benchmark.compareResults([result],baseline),[])
+        result['wall'] = 1.3
+        self.assertEqual(len(benchmark.compareResults([result],baseline)),1)
+        self.assertEqual(benchmark.compareResults([result],baseline,.5),[])
+        result['patterns'] = 728
+        self.assertEqual(len(benchmark.compareResults([result],baseline,.5)),
+                         1)
+        result['support'] = .9
+        self.assertEqual(benchmark.compareResults([result],baseline),[])
+
 class TestDatasetFunctions(unittest.TestCase):
 
     def test_dataset_conversion(self):
@@ -44,8 +628,104 @@ class TestDatasetFunctions(unittest.TestCase):
 
         self.assertEqual(ds.rows,ds2.rows)
             
+    def test_preprocessed_dataset(self):
+        ds = dataset.Dataset()
+        with open('../data/tiny.dat','rU') as f:
+            ds.readFromFile(f)
+        ds.rows.append(['5','1','9'])
+        pds = ds.preprocess(2)
+        self.assertEqual(pds.labels,['1','5','2'])
+        self.assertEqual(pds.rows,[[0,2],[0,1]])
+        self.assertEqual(pds.weights,[2,3])
+        self.assertEqual(len(pds),5)
+        self.assertEqual(list(pds),[[0,2]] * 2 + [[0,1]] * 3)
+        for bitsets in (False,True):
+            vds = dataset.VerticalDataset(bitsets)
+            vds.readFromDataset(pds)
+            self.assertEqual(len(vds),5)
+            self.assertEqual(vds.itemsetSupport([0]),5)
+            self.assertEqual(vds.itemsetSupport([0,1]),3)
+
+    def test_bitset_tidsets(self):
+        ds = dataset.NumericalDataset()
+        with open('../data/chess_tiny.dat','rU') as f:
+            ds.readFromFile(f)
+        vds = dataset.VerticalDataset()
+        vds.readFromDataset(ds)
+        bvds = dataset.VerticalDataset(bitsets=True)
+        bvds.readFromDataset(ds)
+
+        for item in vds.tidsets.keys():
+            self.assertEqual(set(bvds.tids(item)),vds.tidsets[item])
+            self.assertEqual(bvds.support(bvds.tidsets[item]),
+                             vds.support(vds.tidsets[item]))
+        self.assertEqual(bvds.itemsetSupport([1,3,12]),
+                         vds.itemsetSupport([1,3,12]))
+        # unknown items have no tids and are not added as items
+        for v in (vds,bvds):
+            items = len(v.tidsets)
+            self.assertEqual(v.itemsetSupport([99999]),0)
+            self.assertEqual(v.itemsetSupport([1,99999]),0)
+            self.assertEqual(list(v.tids(99999)),[])
+            self.assertEqual(len(v.tidsets),items)
+
+        ds2 = dataset.NumericalDataset()
+        ds2.readFromDataset(bvds)
+        self.assertEqual(ds2.rows,ds.rows)
+
+    def test_binary_dataset(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir,'chess_tiny.dat')
+            shutil.copy('../data/chess_tiny.dat',path)
+            ds = dataset.NumericalDataset()
+            with open(path,'rU') as f:
+                ds.readFromFile(f)
+
+            for _ in range(2):
+                # the second read maps the cache written by the first
+                bds = dataset.BinaryDataset()
+                with open(path,'rU') as f:
+                    bds.readFromFile(f)
+                self.assertTrue(os.path.exists(path + '.bin'))
+                self.assertEqual(len(bds),len(ds))
+                self.assertEqual(list(bds),ds.rows)
+                self.assertEqual(bds.rows[-1],ds.rows[-1])
+
+            # when the cache can not be written the rows are parsed
+            def failingWrite(rows,path):
+                raise IOError('read-only')
+            os.remove(path + '.bin')
+            write = dataset.writeBinaryDataset
+            dataset.writeBinaryDataset = failingWrite
+            try:
+                bds = dataset.BinaryDataset()
+                with open(path,'rU') as f:
+                    bds.readFromFile(f)
+            finally:
+                dataset.writeBinaryDataset = write
+            self.assertFalse(os.path.exists(path + '.bin'))
+            self.assertEqual(bds.rows,ds.rows)
+
+            # a bad item fails the read without leaving a partial cache
+            bad = os.path.join(tmpdir,'bad.dat')
+            with open(bad,'w') as f:
+                f.write('1 2\n4 a 5\n')
+            with open(bad,'rU') as f:
+                self.assertRaises(ValueError,
+                                  dataset.BinaryDataset().readFromFile,f)
+            self.assertEqual(sorted(os.listdir(tmpdir)),
+                             ['bad.dat','chess_tiny.dat'])
+        finally:
+            shutil.rmtree(tmpdir)
+
 if __name__ == '__main__':
     tl = unittest.TestLoader()
     suite = tl.loadTestsFromTestCase(TestFrequentPatternFunctions)
+    suite.addTest(tl.loadTestsFromTestCase(TestStreamMiningFunctions))
+    suite.addTest(tl.loadTestsFromTestCase(TestRuleFunctions))
+    suite.addTest(tl.loadTestsFromTestCase(TestResultCacheFunctions))
+    suite.addTest(tl.loadTestsFromTestCase(TestPatternIOFunctions))
+    suite.addTest(tl.loadTestsFromTestCase(TestBenchmarkFunctions))
     suite.addTest(tl.loadTestsFromTestCase(TestDatasetFunctions))
     unittest.TextTestRunner(verbosity=2).run(suite)
@@ -1,4 +1,4 @@
 #!/bin/bash
 TIME=`date +%s`
-../code/apriori_timing.py ../logs/apriori.timing.${TIME}.txt 1 10 2> /dev/null
-
+mkdir -p ../logs
+../code/benchmark.py -m apriori -b ../baselines/benchmark.json ../logs/apriori.benchmark.${TIME}.json "$@"
@@ -1,3 +1,4 @@
 #!/bin/bash
 TIME=`date +%s`
-../code/eclat_timing.py ../logs/eclat.timing.${TIME}.txt 1 10 2> /dev/null
+mkdir -p ../logs
+../code/benchmark.py -m eclat -b ../baselines/benchmark.json ../logs/eclat.benchmark.${TIME}.json "$@"
@@ -1,3 +1,4 @@
 #!/bin/bash
 TIME=`date +%s`
-../code/fpgrowth_timing.py ../logs/fpgrowth.timing.${TIME}.txt 1 10 2> /dev/null
+mkdir -p ../logs
+../code/benchmark.py -m fpgrowth -b ../baselines/benchmark.json ../logs/fpgrowth.benchmark.${TIME}.json "$@"
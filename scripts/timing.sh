@@ -1,4 +1,4 @@
 #!/bin/bash
 TIME=`date +%s`
-../code/timing.py ../logs/timing.${TIME}.txt 1 10
-
+mkdir -p ../logs
+../code/benchmark.py -b ../baselines/benchmark.json ../logs/benchmark.${TIME}.json "$@"